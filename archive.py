@@ -0,0 +1,301 @@
+"""
+archive — convert .p files straight from a zip/tar archive, without extracting. Used by main.py.
+
+API: is_archive(path), is_bundle(out), convert_archive(src, out, jobs) → BatchStats,
+convert_files(jobs, out, workers) → BatchStats.
+
+Members (or the files of a batch) are streamed in order, decoded in a process
+pool (ptompy.convert_bytes) and written to an output sink: a directory tree, or
+a single .zip / .tar / .tar.gz archive (a bundle) when `out` has one of those
+suffixes. Bundles are written by a dedicated writer thread and end with a
+MANIFEST member listing every output (path, source, size, sha256) and failure.
+
+    archive | .p files ──> pool: convert_bytes ──> writer thread ──> sink (dir | zip | tar)
+"""
+
+import hashlib
+import io
+import json
+import os
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path, PurePosixPath, PureWindowsPath
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import ptompy
+from batch import BatchStats
+
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+MANIFEST = "ptompy_manifest.json"
+
+
+def _has_suffix(path, suffixes) -> bool:
+    return str(path).lower().endswith(suffixes)
+
+
+def is_archive(path) -> bool:
+    """True for an existing zip or tar file (by suffix, confirmed by content)."""
+    p = Path(path)
+    if not p.is_file():
+        return False
+    if _has_suffix(p, ZIP_SUFFIXES):
+        return zipfile.is_zipfile(p)
+    if _has_suffix(p, TAR_SUFFIXES):
+        return tarfile.is_tarfile(p)
+    return False
+
+
+def is_bundle(out) -> bool:
+    """True if out names a single output archive (.zip / .tar[.gz|...]) rather than a directory."""
+    return bool(out) and _has_suffix(out, ZIP_SUFFIXES + TAR_SUFFIXES)
+
+
+def _safe_member_path(name: str) -> Optional[PurePosixPath]:
+    """Relative member path, or None if it is absolute (POSIX or Windows: C:/x, C:x, //host/x) or escapes the output root."""
+    rel = PurePosixPath(name.replace("\\", "/"))
+    if rel.is_absolute() or PureWindowsPath(name).anchor or ".." in rel.parts:
+        return None
+    return rel
+
+
+def iter_pfile_members(src) -> Iterator[Tuple[str, bytes]]:
+    """Yield (member name, contents) of every *.p member, in archive order."""
+    if _has_suffix(src, ZIP_SUFFIXES):
+        with zipfile.ZipFile(src) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.endswith(".p"):
+                    yield info.filename, zf.read(info)
+    else:
+        # "r|*": sequential stream, no seeking / member index needed
+        with tarfile.open(src, "r|*") as tf:
+            for info in tf:
+                if info.isfile() and info.name.endswith(".p"):
+                    yield info.name, tf.extractfile(info).read()
+
+
+class DirSink:
+    """Write outputs as a file tree below root."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def write(self, relpath: str, text: str, source: str = "") -> None:
+        path = (self.root / relpath).resolve()
+        if not path.is_relative_to(self.root.resolve()):
+            raise ValueError(f"Output path outside {self.root}: {relpath}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        ptompy._replace_text(path, text)
+
+    def fail(self, source: str, msg: str) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class _BundleSink:
+    """Base of the single-archive sinks: collects the manifest, added as the last member on close()."""
+
+    def __init__(self):
+        self.entries: List[dict] = []
+        self.errors: List[List[str]] = []
+
+    def write(self, relpath: str, text: str, source: str = "") -> None:
+        data = text.encode("utf-8")
+        self._add(relpath, data)
+        self.entries.append({"path": relpath, "source": source, "bytes": len(data), "sha256": hashlib.sha256(data).hexdigest()})
+
+    def fail(self, source: str, msg: str) -> None:
+        self.errors.append([source, msg])
+
+    def close(self) -> None:
+        manifest = {"files": self.entries, "errors": self.errors, "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self._add(MANIFEST, json.dumps(manifest, indent=1).encode("utf-8"))
+        self._close()
+
+
+class ZipSink(_BundleSink):
+    """Write outputs as members of one zip file (level: deflate 0-9, None = zlib default)."""
+
+    def __init__(self, path, level: Optional[int] = None):
+        super().__init__()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._zf = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=level)
+
+    def _add(self, relpath: str, data: bytes) -> None:
+        self._zf.writestr(relpath, data)
+
+    def _close(self) -> None:
+        self._zf.close()
+
+
+class TarSink(_BundleSink):
+    """Write outputs as members of one tar file (compression from the suffix; level: 0-9, None = default)."""
+
+    def __init__(self, path, level: Optional[int] = None):
+        super().__init__()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        mode, kwargs = "w", {}
+        # (suffixes, mode, level keyword, lowest level)
+        for suffixes, compressed, option, lowest in (
+            ((".gz", ".tgz"), "w:gz", "compresslevel", 0),
+            ((".bz2", ".tbz2"), "w:bz2", "compresslevel", 1),
+            ((".xz", ".txz"), "w:xz", "preset", 0),
+        ):
+            if _has_suffix(path, suffixes):
+                mode = compressed
+                if level is not None:
+                    kwargs[option] = max(level, lowest)
+        self._tf = tarfile.open(path, mode, **kwargs)
+
+    def _add(self, relpath: str, data: bytes) -> None:
+        info = tarfile.TarInfo(relpath)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tf.addfile(info, io.BytesIO(data))
+
+    def _close(self) -> None:
+        self._tf.close()
+
+
+def open_sink(out, level: Optional[int] = None):
+    """DirSink, ZipSink or TarSink depending on the suffix of out (level: bundle compression)."""
+    if _has_suffix(out, ZIP_SUFFIXES):
+        return ZipSink(out, level)
+    if _has_suffix(out, TAR_SUFFIXES):
+        return TarSink(out, level)
+    return DirSink(out)
+
+
+class WriterThread:
+    """
+    Runs a sink's write/fail calls on one dedicated thread, so compressing and
+    writing the bundle overlaps with decoding. At most `backlog` outputs wait;
+    an error of the sink is raised again by close().
+    """
+
+    _STOP = object()
+
+    def __init__(self, sink, backlog: int = 64):
+        self.sink = sink
+        self._queue = queue.Queue(maxsize=backlog)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="sink-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            call = self._queue.get()
+            if call is self._STOP:
+                return
+            if self._error is None:
+                try:
+                    call[0](*call[1:])
+                except BaseException as e:  # reported by close(); keep draining so producers never block
+                    self._error = e
+
+    def write(self, relpath: str, text: str, source: str = "") -> None:
+        self._queue.put((self.sink.write, relpath, text, source))
+
+    def fail(self, source: str, msg: str) -> None:
+        self._queue.put((self.sink.fail, source, msg))
+
+    def close(self) -> None:
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self.sink.close()
+        if self._error is not None:
+            raise self._error
+
+
+def _convert_member(name: str, data: bytes) -> Tuple[str, int, str, Optional[str], list]:
+    """Pool worker: (name, code, msg, source, [its "convert" span]) (spans: see ptompy._record_task_spans)."""
+    start = time.time()
+    code, msg, source = ptompy.convert_bytes(data, name)
+    return name, code, msg, source, [("convert", start, time.time(), os.getpid(), name)]
+
+
+def _convert_stream(members: Iterable[Tuple[str, Optional[str], object]], sink, jobs: int, log) -> BatchStats:
+    """
+    Convert (name, relpath, .p contents) triples into sink; relpath None: skipped,
+    the third item is the reason. At most 4 * jobs inputs are in flight, so large
+    inputs are never fully in memory.
+    """
+    stats = BatchStats()
+
+    def collect(relpath, fut):
+        name, code, msg, source, spans = fut.result()
+        ptompy._record_task_spans(spans)
+        if code == 0:
+            sink.write(relpath, source, name)
+            msg = f"Saved to {relpath}"
+        else:
+            stats.failed += 1
+            stats.errors.append((name, msg))
+            sink.fail(name, msg)
+        if log:
+            log(f"{name}: {msg}")
+
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, jobs)) as pool:
+            in_flight = deque()
+            for name, relpath, data in members:
+                stats.total += 1
+                if relpath is None:
+                    stats.failed += 1
+                    stats.errors.append((name, data))
+                    sink.fail(name, data)
+                    if log:
+                        log(f"{name}: skipped ({data})")
+                    continue
+                in_flight.append((relpath, pool.submit(_convert_member, name, data)))
+                if len(in_flight) >= 4 * max(1, jobs):
+                    collect(*in_flight.popleft())
+            while in_flight:
+                collect(*in_flight.popleft())
+    finally:
+        sink.close()
+    stats.unique = stats.total
+    return stats
+
+
+def _open_output(out, level: Optional[int]):
+    """Sink for out; bundles get their own writer thread."""
+    sink = open_sink(out, level)
+    return WriterThread(sink) if is_bundle(out) else sink
+
+
+def convert_archive(src, out, jobs: int = 2, log=print, level: Optional[int] = None) -> BatchStats:
+    """Convert every *.p member of archive src into out (directory or bundle, see open_sink)."""
+    def members():
+        for name, data in iter_pfile_members(src):
+            rel = _safe_member_path(name)
+            if rel is None:
+                yield name, None, "Unsafe member path"
+            else:
+                yield name, str(rel.with_suffix(".m")), data
+
+    return _convert_stream(members(), _open_output(out, level), jobs, log)
+
+
+def convert_files(jobs: List[Tuple[Path, Path]], out, workers: int = 2, log=print, level: Optional[int] = None) -> BatchStats:
+    """
+    Convert batch (pfile, mfile) pairs (batch.collect_jobs(inputs, out)) into the bundle out:
+    one archive member per output, at its path below out. level: compression 0-9 (CPU vs I/O).
+    """
+    def members():
+        for pfile, mfile in jobs:
+            try:
+                data = pfile.read_bytes()
+            except OSError as e:
+                yield str(pfile), None, str(e)
+                continue
+            yield str(pfile), Path(mfile).relative_to(out).as_posix(), data
+
+    return _convert_stream(members(), _open_output(out, level), workers, log)
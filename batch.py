@@ -0,0 +1,221 @@
+"""
+batch — convert many .p files in one run. Used by main.py (--batch, reformat).
+
+API: collect_jobs(inputs, out_dir) → [(pfile, mfile)], convert_batch(jobs, dedup) → BatchStats,
+reformat_batch(jobs, settings) → BatchStats.
+
+With dedup, inputs are grouped by content hash: each unique payload is decoded
+once (ptompy.parse) and the result is fanned out to the other destinations.
+
+    jobs ──> group by sha256 ──> parse first of group ──> link/copy to the rest
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import ptompy
+
+# Linux FICLONE ioctl: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+LINK_MODES = ("auto", "reflink", "hardlink", "copy")
+
+
+@dataclass
+class BatchStats:
+    """Outcome of a batch run."""
+    total: int = 0
+    unique: int = 0          # inputs actually decoded
+    fanned_out: int = 0      # outputs produced from an already decoded twin
+    failed: int = 0
+    links: Dict[str, int] = field(default_factory=dict)  # fan-out method → count
+    errors: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Inputs per decoded payload (1.0 = no duplicates)."""
+        return self.total / self.unique if self.unique else 1.0
+
+    def summary(self) -> str:
+        ok = self.total - self.failed
+        text = f"Converted {ok}/{self.total} files"
+        if self.fanned_out or self.unique != self.total:
+            methods = ", ".join(f"{k}={v}" for k, v in sorted(self.links.items()))
+            text += (
+                f"; decoded {self.unique} unique, fanned out {self.fanned_out}"
+                f" ({methods or 'none'}); dedup ratio {self.dedup_ratio:.2f}"
+            )
+        return text
+
+
+def output_path(pfile: Path, root: Optional[Path] = None, out_dir: Optional[str] = None) -> Path:
+    """
+    .m path for pfile: next to it without out_dir, else mirrored below out_dir
+    (relative to root, the input directory pfile was found in).
+    """
+    if not out_dir:
+        return pfile.with_suffix(".m")
+    rel = pfile.relative_to(root) if root else Path(pfile.name)
+    return (Path(out_dir) / rel).with_suffix(".m")
+
+
+def collect_jobs(inputs: Iterable[str], out_dir: Optional[str] = None, suffix: str = ".p") -> List[Tuple[Path, Path]]:
+    """
+    Expand files/directories into (pfile, mfile) pairs (see output_path).
+    Directories are searched recursively for *.p (*suffix: e.g. ptompy.IR_SUFFIX).
+    """
+    jobs = []
+    for item in inputs:
+        root = Path(item)
+        if root.is_dir():
+            pfiles = sorted(p for p in root.rglob("*" + suffix) if p.is_file())
+            jobs.extend((pfile, output_path(pfile, root, out_dir)) for pfile in pfiles)
+        else:
+            jobs.append((root, output_path(root, None, out_dir)))
+    return jobs
+
+
+def _content_hash(path: Path) -> str:
+    """sha256 of file contents (hex)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    """Copy-on-write clone (Linux btrfs/xfs). Raises OSError if unsupported."""
+    if not sys.platform.startswith("linux"):
+        raise OSError("reflink not supported on this platform")
+    import fcntl
+    with open(src, "rb") as fs, open(dst, "wb") as fd:
+        try:
+            fcntl.ioctl(fd.fileno(), _FICLONE, fs.fileno())
+        except OSError:
+            fd.close()
+            os.unlink(dst)
+            raise
+
+
+def _fan_out(src: Path, dst: Path, link: str = "auto") -> str:
+    """
+    Make dst hold the same content as src. Returns the method used.
+    auto: reflink → hardlink → copy (first that the filesystem supports).
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.resolve() == src.resolve():
+        return "same"
+    tmp = dst.with_name(dst.name + ".tmp")
+    methods = ("reflink", "hardlink", "copy") if link == "auto" else (link,)
+    for method in methods:
+        try:
+            if tmp.exists():
+                tmp.unlink()
+            if method == "reflink":
+                _reflink(src, tmp)
+            elif method == "hardlink":
+                os.link(src, tmp)
+            else:
+                shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+            return method
+        except OSError:
+            if method == methods[-1]:
+                raise
+    return "copy"
+
+
+def convert_batch(
+    jobs: List[Tuple[Path, Path]],
+    dedup: bool = False,
+    link: str = "auto",
+    log=print,
+    journal=None,
+    index=None,
+    ir: bool = False,
+) -> BatchStats:
+    """
+    Convert (pfile, mfile) pairs. With dedup, identical .p contents are decoded once
+    and the other outputs are fanned out with `link` (see _fan_out).
+    log: callable for per-file messages (None = silent).
+    journal: journal.Journal recording every input's outcome (for --resume).
+    index: symbols.SymbolIndex to record names and functions of every converted file in.
+    ir: also save intermediate files next to the outputs (see ptompy.reformat).
+    """
+    stats = BatchStats(total=len(jobs))
+    arena = ptompy.ScratchArena()
+    groups: Dict[str, List[Tuple[Path, Path]]] = {}
+    digests: Dict[Path, Optional[str]] = {}
+    for pfile, mfile in jobs:
+        digests[pfile] = _content_hash(pfile) if (dedup or journal) and pfile.is_file() else None
+        key = digests[pfile] if dedup and digests[pfile] else str(pfile)
+        groups.setdefault(key, []).append((pfile, mfile))
+
+    for members in groups.values():
+        stats.unique += 1
+        pfile, mfile = members[0]
+        t0 = time.perf_counter()
+        code, msg = ptompy.parse(str(pfile), str(mfile), arena=arena, index=index, ir=ir)
+        if log:
+            log(f"{pfile}: {msg}")
+        if journal:
+            journal.record(pfile, mfile, code, msg, time.perf_counter() - t0, digests[pfile])
+        if code != 0:
+            stats.failed += len(members)
+            stats.errors.extend((str(p), msg) for p, _ in members)
+            if journal:
+                for twin_pfile, twin_mfile in members[1:]:
+                    journal.record(twin_pfile, twin_mfile, code, msg, 0.0, digests[twin_pfile])
+            continue
+        for twin_pfile, twin_mfile in members[1:]:
+            t0 = time.perf_counter()
+            try:
+                method = _fan_out(mfile, twin_mfile, link)
+                if ir:
+                    _fan_out(mfile.with_suffix(ptompy.IR_SUFFIX), twin_mfile.with_suffix(ptompy.IR_SUFFIX), link)
+            except OSError as e:
+                stats.failed += 1
+                stats.errors.append((str(twin_pfile), str(e)))
+                if journal:
+                    journal.record(twin_pfile, twin_mfile, 3, str(e), time.perf_counter() - t0, digests[twin_pfile])
+                continue
+            stats.fanned_out += 1
+            stats.links[method] = stats.links.get(method, 0) + 1
+            if index is not None:
+                index.add_copy(pfile, twin_pfile, twin_mfile)
+            if journal:
+                journal.record(twin_pfile, twin_mfile, 0, f"{method} of {mfile}", time.perf_counter() - t0, digests[twin_pfile])
+            if log:
+                log(f"{twin_pfile}: {method} of {mfile}")
+    return stats
+
+
+def _reformat_job(task) -> Tuple[str, int, str]:
+    irfile, mfile, settings = task
+    code, msg = ptompy.reformat(str(irfile), str(mfile), settings, skip_unchanged=True)
+    return str(irfile), code, msg
+
+
+def reformat_batch(jobs: List[Tuple[Path, Path]], settings: Optional[dict] = None, workers: int = 2, log=print) -> BatchStats:
+    """
+    Write (irfile, mfile) pairs from intermediate files with other formatter settings
+    (ptompy.reformat, in `workers` processes). Unchanged outputs are not rewritten.
+    """
+    stats = BatchStats(total=len(jobs), unique=len(jobs))
+    tasks = [(irfile, mfile, settings) for irfile, mfile in jobs]
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        for irfile, code, msg in pool.map(_reformat_job, tasks, chunksize=16):
+            if code != 0:
+                stats.failed += 1
+                stats.errors.append((irfile, msg))
+            if log:
+                log(f"{irfile}: {msg}")
+    return stats
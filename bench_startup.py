@@ -0,0 +1,103 @@
+"""
+Compare startup latency and size of the GUI build and the console-only build (Linux).
+Run: python bench_startup.py [--runs N] [--drop-caches] [--source]
+
+Builds (see build_nuitka.py):
+  gui      build/main.dist/ptompy.exe            python build_nuitka.py
+  console  build/console/cli.dist/ptompy         python build_nuitka.py --console
+
+Each build converts examples/myplot.p (a tiny file, so the time is startup) N
+times. The first run is reported separately; with --drop-caches (root) the page
+cache is dropped before it, making it a true cold start. --source times
+`python main.py` against `python cli.py` instead (no build needed).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SAMPLE = os.path.join(ROOT, "examples", "myplot.p")
+
+BUILDS = {
+    "gui": os.path.join(ROOT, "build", "main.dist", "ptompy.exe"),
+    "console": os.path.join(ROOT, "build", "console", "cli.dist", "ptompy.exe" if sys.platform == "win32" else "ptompy"),
+}
+SOURCES = {
+    "gui": [sys.executable, os.path.join(ROOT, "main.py")],
+    "console": [sys.executable, os.path.join(ROOT, "cli.py")],
+}
+
+
+def _tree_size(path: str) -> int:
+    """Total bytes of the files below path."""
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def _drop_caches() -> bool:
+    """Drop the Linux page cache (needs root); False if not possible."""
+    try:
+        subprocess.run(["sync"], check=True)
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    except OSError:
+        return False
+
+
+def _time_run(cmd: list, mfile: str) -> float:
+    t0 = time.perf_counter()
+    subprocess.run(cmd + [SAMPLE, mfile], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+
+def bench(name: str, cmd: list, runs: int, drop_caches: bool) -> dict:
+    """First (cold) run and the median/min of the following (warm) runs, in ms."""
+    with tempfile.TemporaryDirectory() as tmp:
+        mfile = os.path.join(tmp, "myplot.m")
+        cold_dropped = drop_caches and _drop_caches()
+        first = _time_run(cmd, mfile)
+        warm = [_time_run(cmd, mfile) for _ in range(runs)]
+    return {
+        "name": name,
+        "first_ms": first * 1000,
+        "cold": cold_dropped,
+        "median_ms": statistics.median(warm) * 1000,
+        "min_ms": min(warm) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup latency and size: GUI build vs console build.")
+    parser.add_argument("--runs", type=int, default=20, help="warm runs per build")
+    parser.add_argument("--drop-caches", action="store_true", help="drop the page cache before the first run (root, Linux)")
+    parser.add_argument("--source", action="store_true", help="time python main.py vs python cli.py instead of the builds")
+    args = parser.parse_args()
+
+    print(f"{'build':<9}{'first ms':>10}{'median ms':>11}{'min ms':>8}{'exe MiB':>9}{'dist MiB':>10}")
+    for name in ("gui", "console"):
+        if args.source:
+            cmd, exe_size, dist_size = SOURCES[name], None, None
+        else:
+            exe = BUILDS[name]
+            if not os.path.isfile(exe):
+                print(f"{name:<9}not built ({exe})")
+                continue
+            cmd, exe_size, dist_size = [exe], os.path.getsize(exe), _tree_size(os.path.dirname(exe))
+        try:
+            r = bench(name, cmd, args.runs, args.drop_caches)
+        except subprocess.CalledProcessError as e:
+            print(f"{name:<9}failed (exit {e.returncode})")
+            continue
+        first = f"{r['first_ms']:.0f}{'*' if r['cold'] else ''}"
+        sizes = f"{exe_size / 2**20:>9.1f}{dist_size / 2**20:>10.1f}" if exe_size is not None else f"{'-':>9}{'-':>10}"
+        print(f"{name:<9}{first:>10}{r['median_ms']:>11.0f}{r['min_ms']:>8.0f}{sizes}")
+    if args.drop_caches:
+        print("* first run after dropping the page cache")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@
 Build PtoMpy with Nuitka. Run: python build_nuitka.py
 
 Options:
+  --console      Console-only build of the command line (cli.py): no tkinter, no
+                 Pillow, no icons. Output: build/console/cli.dist/ptompy[.exe].
+                 Compare it with the GUI build: python bench_startup.py
   --mingw64      Use MinGW64 (Nuitka downloads it locally). Requires Python 3.12
                  or lower; Python 3.13+ needs MSVC instead.
   --venv-py312   Create a Python 3.12 venv, install nuitka+Pillow, and run the
@@ -19,6 +22,17 @@ import os
 import subprocess
 import sys
 
+# Not used by main.py/ptompy: left out of every build to minimize footprint.
+# multiprocessing and concurrent.futures must stay in: watch, archive, pipeline,
+# verify, convert_many and the formatter's --jobs run process pools, and
+# main.py/cli.py call multiprocessing.freeze_support() for them.
+EXCLUDED_MODULES = [
+    "unittest", "test", "doctest", "pydoc", "setuptools", "distutils", "pip",
+    "idlelib", "ensurepip", "lib2to3", "tkinter.test",
+]
+# Additionally left out of the console build (GUI only)
+GUI_MODULES = ["tkinter", "PIL", "viewer"]
+
 
 def _find_python312():
     """Return path to Python 3.12 executable, or None."""
@@ -105,47 +119,48 @@ def main():
     use_mingw64 = "--mingw64" in sys.argv
     if use_mingw64:
         sys.argv.remove("--mingw64")
+    console = "--console" in sys.argv
+    if console:
+        sys.argv.remove("--console")
 
     os.chdir(root)
     cmd = [
         sys.executable, "-m", "nuitka",
         "--standalone",
         "--assume-yes-for-downloads",
-        "--enable-plugin=tk-inter",
-        "--include-module=ptompy",
-        "--output-dir=build",
-        "--output-filename=ptompy.exe",
-        "--windows-console-mode=disable",
-        # Minimize footprint: exclude modules not used by main.py/ptompy
-        "--nofollow-import-to=unittest",
-        "--nofollow-import-to=test",
-        "--nofollow-import-to=doctest",
-        "--nofollow-import-to=pydoc",
-        "--nofollow-import-to=setuptools",
-        "--nofollow-import-to=distutils",
-        "--nofollow-import-to=pip",
-        "--nofollow-import-to=idlelib",
-        "--nofollow-import-to=ensurepip",
-        "--nofollow-import-to=lib2to3",
-        "--nofollow-import-to=tkinter.test",
-        "--nofollow-import-to=multiprocessing",
-        "--nofollow-import-to=concurrent.futures",
-        "main.py",
     ]
+    if console:
+        cmd += [
+            "--output-dir=build/console",
+            "--output-filename=ptompy.exe" if sys.platform == "win32" else "--output-filename=ptompy",
+            "--windows-console-mode=force",
+        ]
+        cmd += [f"--nofollow-import-to={name}" for name in EXCLUDED_MODULES + GUI_MODULES]
+        cmd.append("cli.py")
+    else:
+        cmd += [
+            "--enable-plugin=tk-inter",
+            "--include-module=ptompy",
+            "--output-dir=build",
+            "--output-filename=ptompy.exe",
+            "--windows-console-mode=disable",
+        ]
+        cmd += [f"--nofollow-import-to={name}" for name in EXCLUDED_MODULES]
+        cmd.append("main.py")
     if use_mingw64:
         cmd.insert(5, "--mingw64")
         if sys.version_info >= (3, 13):
             print("Warning: MinGW64 is not supported with Python 3.13+. Use Python 3.12 for --mingw64, or install MSVC.")
     elif sys.version_info >= (3, 13):
         cmd.insert(5, "--msvc=latest")
-    # Favicon: prefer icons/favicon.ico so favicon can live with other icons
+    # Favicon: prefer icons/favicon.ico so favicon can live with other icons (GUI build only)
     favicon_src = os.path.join(root, "icons", "favicon.ico")
     if not os.path.isfile(favicon_src):
         favicon_src = os.path.join(root, "favicon.ico")
-    if os.path.isfile(favicon_src):
+    if os.path.isfile(favicon_src) and not console:
         rel = os.path.relpath(favicon_src, root).replace("\\", "/")
         cmd.insert(-1, f"--include-data-files={rel}=favicon.ico")
-    if os.path.isdir(os.path.join(root, "icons")):
+    if os.path.isdir(os.path.join(root, "icons")) and not console:
         cmd.insert(-1, "--include-data-dir=icons=icons")
     # Optional: use --onefile for a single executable (slower startup)
     # cmd.insert(-2, "--onefile")
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+cli — command line interface of ptompy (no GUI imports). Used by main.py (any arguments) and,
+as the entry point, by the console-only build (python build_nuitka.py --console).
+
+API: main(argv) → exit code, info().
+"""
+import argparse
+import contextlib
+import dataclasses
+import json
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+import archive
+import batch
+import journal
+import pipeline
+import profiling
+import ptompy
+import shard
+import symbols
+import timeline
+import verify
+import watch
+
+CONFIG_APP_NAME = 'ptompy tool'
+CONFIG_APP_VERSION = 0.2
+
+
+def info():
+    print("*"*100)
+    print(f"{CONFIG_APP_NAME} - convert Matlab .p to .m")
+    print("Version:      ", f"{CONFIG_APP_NAME} \t{ptom_get_version():.2f}")
+    print("Platform:     ", sys.platform)
+    print("Python:       ", sys.version[:5], 'located at', sys.executable)
+    print("Usage:")
+    print("\t ptompy.exe pfile [mfile]  - convert pfile to mfile (mfile defaults to pfile.m)")
+    print("\t ptompy.exe pfile --preview [N]  - print the first N lines only (decodes just those)")
+    print("\t ptompy.exe pfile --format-jobs N  - format a huge decoded file in N processes")
+    print("\t ptompy.exe --batch PATH... [--out DIR] [--dedup]  - convert files/directories of .p files")
+    print("\t ptompy.exe --batch PATH... --out OUT.zip|OUT.tar.gz [--compress-level 0-9]  - write all outputs into one bundle")
+    print("\t ptompy.exe --batch PATH... --pipeline [--stages R,D,F,W] [--max-inflight-mb MB]  - overlap reading, decoding, formatting and writing")
+    print("\t ptompy.exe --batch PATH... --shard K/N [--shard-by hash|size]  - convert shard K of N, write a manifest")
+    print("\t ptompy.exe merge-manifests M.json... [--out FILE]  - check all shards ran, combine their stats")
+    print("\t ptompy.exe --batch PATH... --resume [--journal FILE]  - continue an interrupted batch (journal of outcomes)")
+    print("\t ptompy.exe ... --index DB, then: ptompy.exe query DB NAME [--like]  - which p-files reference NAME")
+    print("\t ptompy.exe ... --ir, then: ptompy.exe reformat DIR [--indent-width N] [--indent-mode M]  - re-style outputs without decoding again")
+    print("\t ptompy.exe toolbox.zip [--out DIR|out.zip]  - convert .p members of a zip/tar archive")
+    print("\t ptompy.exe --verify PATH... [--jobs N]  - check that every .p decodes, report failures by category")
+    print("\t ptompy.exe --watch DIR [--out DIR] [--jobs N]  - re-convert .p files in DIR when they change")
+    print("\t add --profile / --trace-memory to write .pstats / .tracemalloc files next to the output")
+    print("\t add --timeline FILE to write a Chrome trace of every stage, file and worker (chrome://tracing)")
+    print("\t exit - to quit program (when running without args)")
+    print("*"*100)
+
+def ptom_get_version():
+    return CONFIG_APP_VERSION
+
+def _build_arg_parser():
+    parser = argparse.ArgumentParser(prog="ptompy", description="Convert MATLAB .p files to .m source.")
+    parser.add_argument("pfile", nargs="?", help=".p file (or .zip/.tar[.gz] archive of .p files) to convert")
+    parser.add_argument("mfile", nargs="?", help="output .m file (default: pfile with .m suffix)")
+    parser.add_argument("--tui", action="store_true", help="interactive prompt")
+    parser.add_argument("--preview", type=int, nargs="?", const=ptompy.PREVIEW_LINES, metavar="N", help=f"print the first N lines of pfile (default {ptompy.PREVIEW_LINES}) without converting the rest; writes nothing")
+    parser.add_argument("--batch", nargs="+", metavar="PATH", help=".p files or directories (searched recursively)")
+    parser.add_argument("--out", metavar="DIR", help="batch/archive: output directory, or one .zip/.tar.gz bundle with a manifest (default: next to each .p file / archive name)")
+    parser.add_argument("--compress-level", type=int, choices=range(10), metavar="0-9", help="--out .zip/.tar.gz: compression level (lower: less CPU, more I/O)")
+    parser.add_argument("--dedup", action="store_true", help="batch: decode identical .p contents once and link the outputs")
+    parser.add_argument("--link", choices=batch.LINK_MODES, default="auto", help="batch: how --dedup fans out outputs")
+    parser.add_argument("--pipeline", action="store_true", help="batch: run read/decode/format/write as concurrent stages and report the bottleneck")
+    parser.add_argument("--stages", type=pipeline.Stages.parse, default=pipeline.Stages(), metavar="R,D,F,W", help="pipeline: reader threads, decoder threads, formatter processes, writer threads")
+    parser.add_argument("--max-inflight-mb", type=float, metavar="MB", help="pipeline: cap on the decompressed size of the files in flight")
+    parser.add_argument("--shard", type=shard.parse_spec, metavar="K/N", help="batch: convert only shard K of N (1-based) and write a shard manifest")
+    parser.add_argument("--shard-by", choices=shard.METHODS, default="hash", help="shard: partition by path hash or by header sizes (balanced work)")
+    parser.add_argument("--manifest", metavar="FILE", help="shard: manifest path (default: OUT/ptompy_shard_K_of_N.json)")
+    parser.add_argument("--journal", metavar="FILE", help="batch: append every input's outcome to FILE (default with --resume: OUT/ptompy_journal.jsonl)")
+    parser.add_argument("--resume", action="store_true", help="batch: skip inputs the journal records as converted (same content), retry the rest")
+    parser.add_argument("--ir", action="store_true", help="single file/batch: also save a compact intermediate file (.mir) next to each output (see: ptompy reformat)")
+    parser.add_argument("--index", metavar="DB", help="single file/batch: record names and functions of converted files in SQLite DB (see: ptompy query)")
+    parser.add_argument("--verify", nargs="+", metavar="PATH", help="only check that .p files/directories decode (no formatting, nothing written); failures by category")
+    parser.add_argument("--watch", metavar="DIR", help="re-convert .p files below DIR whenever they are added or changed")
+    parser.add_argument("--interval", type=float, default=1.0, help="watch: seconds between polls")
+    parser.add_argument("--debounce", type=float, default=0.5, help="watch: seconds a file must be unchanged before converting")
+    parser.add_argument("--jobs", type=int, default=2, help="watch/archive/verify/bundle: worker processes")
+    parser.add_argument("--format-jobs", type=int, default=1, metavar="N", help="single file: processes for formatting a huge output (split at functions)")
+    parser.add_argument("--timeline", metavar="FILE", help="write a Chrome trace (JSON) of every file's read/inflate/decode/format/write per worker")
+    parser.add_argument("--profile", action="store_true", help="write cProfile stats (.pstats) next to the output")
+    parser.add_argument("--trace-memory", action="store_true", help="write a tracemalloc snapshot (.tracemalloc) next to the output")
+    return parser
+
+def _merge_manifests(argv):
+    """ptompy merge-manifests M.json... [--out FILE]: check all shards are there, sum their stats."""
+    parser = argparse.ArgumentParser(prog="ptompy merge-manifests", description="Verify and combine --shard manifests.")
+    parser.add_argument("manifests", nargs="+", help="shard manifests (ptompy_shard_K_of_N.json)")
+    parser.add_argument("--out", metavar="FILE", help="write the merged manifest (JSON)")
+    args = parser.parse_args(argv)
+    complete, merged = shard.merge_manifests(args.manifests)
+    for problem in merged["problems"]:
+        print(f"INCOMPLETE: {problem}")
+    stats = merged.pop("stats", None)
+    if stats:
+        print(stats.summary())
+        merged["stats"] = dataclasses.asdict(stats)
+    if args.out:
+        Path(args.out).write_text(json.dumps(merged, indent=1), encoding="utf-8")
+        print(f"Wrote {args.out}")
+    return 0 if complete else 1
+
+def _query(argv):
+    """ptompy query DB NAME [--like]: which p-files reference identifier NAME (from --index)."""
+    parser = argparse.ArgumentParser(prog="ptompy query", description="Look up an identifier in a --index database.")
+    parser.add_argument("db", help="SQLite database written with --index")
+    parser.add_argument("name", help="identifier (with --like: SQL LIKE pattern, e.g. plot%%)")
+    parser.add_argument("--like", action="store_true", help="NAME is a LIKE pattern")
+    args = parser.parse_args(argv)
+    t0 = time.perf_counter()
+    refs, defs = symbols.query(args.db, args.name, like=args.like)
+    ms = (time.perf_counter() - t0) * 1000
+    for pfile, mfile, line, signature in defs:
+        print(f"{pfile}: defines {signature} ({mfile}:{line})")
+    for pfile, mfile, name, groups in refs:
+        print(f"{pfile}: references {name} (name table groups {', '.join(map(str, groups))})")
+    print(f"{len(refs)} referencing files, {len(defs)} definitions ({ms:.1f} ms)")
+    return 0 if refs or defs else 1
+
+def _reformat(argv):
+    """ptompy reformat PATH... [--out DIR] [formatter options]: .mir intermediate files → .m, formatting only."""
+    modes = dict(all_functions=1, only_nested_functions=-1, classic=0)
+    parser = argparse.ArgumentParser(prog="ptompy reformat", description="Re-style converted files from their --ir intermediate files.")
+    parser.add_argument("paths", nargs="+", metavar="PATH", help=".mir files or directories (searched recursively)")
+    parser.add_argument("--out", metavar="DIR", help="output directory (default: next to each .mir file)")
+    parser.add_argument("--indent-width", type=int, default=ptompy.FORMAT_DEFAULTS["indentwidth"], help="spaces per indent level")
+    parser.add_argument("--indent-mode", choices=modes, default="all_functions", help="indent function bodies: all, only nested, or none (classic)")
+    parser.add_argument("--no-separate-blocks", action="store_true", help="do not put blank lines around blocks")
+    parser.add_argument("--jobs", type=int, default=2, help="worker processes")
+    args = parser.parse_args(argv)
+    settings = dict(indentwidth=args.indent_width, separateBlocks=not args.no_separate_blocks, indentMode=modes[args.indent_mode])
+    jobs = batch.collect_jobs(args.paths, args.out, suffix=ptompy.IR_SUFFIX)
+    t0 = time.perf_counter()
+    stats = batch.reformat_batch(jobs, settings, workers=args.jobs)
+    print(f"{stats.summary()} in {time.perf_counter() - t0:.2f} s")
+    return 1 if stats.failed else 0
+
+def _run(args, out_base, func, *func_args, **func_kwargs):
+    """Call func, under profiling.profiled when --profile/--trace-memory is given."""
+    if not (args.profile or args.trace_memory):
+        return func(*func_args, **func_kwargs)
+    result, report = profiling.profiled(
+        func, *func_args, out_base=out_base,
+        profile=args.profile, trace_memory=args.trace_memory, **func_kwargs,
+    )
+    print(report)
+    return result
+
+
+def main(argv=None):
+    """Run the command line (argv: arguments without the program name, default sys.argv[1:])."""
+    argv = sys.argv[1:] if argv is None else argv
+    info()
+    if not ptompy.init():
+        print("Initialization failed")
+        return 1
+    if argv and argv[0] == "merge-manifests":
+        return _merge_manifests(argv[1:])
+    if argv and argv[0] == "query":
+        return _query(argv[1:])
+    if argv and argv[0] == "reformat":
+        return _reformat(argv[1:])
+    parser = _build_arg_parser()
+    args = parser.parse_args(argv)
+    _check_args(parser, args)
+    if not args.timeline:
+        return _convert(args)
+    with timeline.recording(args.timeline) as recorded:
+        code = _convert(args)
+    print(f"Wrote {args.timeline} ({len(recorded.events)} events)")
+    return code
+
+
+def _check_args(parser, args):
+    """Reject flag combinations that cannot run together (usage error: exit status 2)."""
+    if args.batch and args.pipeline and args.dedup:
+        parser.error("--dedup cannot be combined with --pipeline")
+    if args.batch and archive.is_bundle(args.out) and (
+        args.pipeline or args.dedup or args.resume or args.journal or args.index or args.ir
+    ):
+        parser.error("--out .zip/.tar.gz cannot be combined with --pipeline, --dedup, --resume, --journal, --index or --ir")
+
+
+def _convert(args):
+    """Run the conversion selected by the parsed arguments."""
+    if args.verify:
+        stats = verify.verify_many([pfile for pfile, _ in batch.collect_jobs(args.verify)], jobs=args.jobs)
+        print(stats.report())
+        return 1 if stats.failed else 0
+    if args.watch:
+        watch.watch(args.watch, args.out, interval=args.interval, debounce=args.debounce, jobs=args.jobs)
+        return
+    if args.batch:
+        jobs = batch.collect_jobs(args.batch, args.out)
+        if args.shard:
+            all_jobs = jobs
+            jobs = shard.select(all_jobs, *args.shard, args.shard_by)
+        bundle = archive.is_bundle(args.out)
+        out_dir = Path(args.out).parent if bundle else Path(args.out or ".")  # for run artifacts
+        out_base = str(out_dir / "ptompy_batch")
+        journal_path = args.journal or (args.resume and str(out_dir / "ptompy_journal.jsonl"))
+        todo = jobs
+        if args.resume:
+            todo = journal.pending(jobs, journal.load(journal_path))
+            print(f"Resuming: {len(jobs) - len(todo)} of {len(jobs)} already converted")
+        with contextlib.ExitStack() as stack:
+            jrnl = stack.enter_context(journal.Journal(journal_path)) if journal_path else None
+            index = stack.enter_context(symbols.SymbolIndex(args.index)) if args.index else None
+            if bundle:
+                stats = _run(args, out_base, archive.convert_files, todo, args.out, workers=args.jobs, level=args.compress_level)
+            elif args.pipeline:
+                budget = int(args.max_inflight_mb * 2**20) if args.max_inflight_mb else None
+                stats, report = _run(args, out_base, pipeline.convert_pipelined, todo, args.stages, max_inflight_bytes=budget, journal=jrnl, index=index, ir=args.ir)
+                print(report)
+            else:
+                stats = _run(args, out_base, batch.convert_batch, todo, dedup=args.dedup, link=args.link, journal=jrnl, index=index, ir=args.ir)
+        print(stats.summary())
+        if args.shard:
+            manifest = args.manifest or shard.manifest_path(out_dir, *args.shard)
+            shard.write_manifest(manifest, *args.shard, args.shard_by, all_jobs, jobs, stats)
+            print(f"Wrote {manifest}")
+        return 1 if stats.failed else 0
+    if args.pfile and args.preview is not None:
+        try:
+            lines, more = ptompy.preview(args.pfile, args.preview)
+        except (OSError, ValueError) as e:
+            print(f"{args.pfile}: {e}")
+            return 1
+        print("\n".join(lines + (["..."] if more else [])))
+        return
+    if args.pfile and archive.is_archive(args.pfile):
+        out = args.out or args.mfile or str(Path(args.pfile).parent / Path(args.pfile).name.split('.')[0])
+        stats = archive.convert_archive(args.pfile, out, jobs=args.jobs, level=args.compress_level)
+        print(stats.summary())
+        return 1 if stats.failed else 0
+    if args.pfile and not args.tui:
+        pfile = args.pfile
+        mfile = args.mfile or str(Path(pfile).with_suffix('.m'))
+        with (symbols.SymbolIndex(args.index) if args.index else contextlib.nullcontext()) as index:
+            code, msg = _run(args, mfile, ptompy.parse, pfile, mfile, format_jobs=args.format_jobs, index=index, ir=args.ir)
+        print(msg)
+        return 1 if code else 0
+    while True:
+        pfile = input("pfile (or exit): ").strip()
+        if not pfile or pfile.lower() == "exit":
+            break
+        mfile_in = input("mfile (Enter = same name .m): ").strip()
+        mfile = mfile_in if mfile_in else str(Path(pfile).with_suffix('.m'))
+        code, msg = ptompy.parse(pfile, mfile)
+        print(msg)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # process pools in the frozen build
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+journal — append-only record of batch conversions, for resuming. Used by main.py (--journal, --resume).
+
+API: Journal(path).record(...), load(path) → {pfile: last record}, pending(jobs, records) → jobs still to do.
+
+One JSON object per line, appended (and flushed) as soon as a file is done:
+
+    {"pfile": ..., "mfile": ..., "sha256": ..., "code": 0, "msg": ..., "seconds": ..., "time": ...}
+
+After Ctrl+C, a crash or a reboot, --resume skips inputs whose last record
+succeeded for the same content (sha256) and output path with the output still
+present; failed, changed and unrecorded inputs are converted again. A torn
+last line (crash mid-write) is ignored.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from batch import _content_hash
+
+# fsync every N records: a reboot loses at most the last few (they are redone)
+_SYNC_EVERY = 64
+
+
+class Journal:
+    """Appends one line per converted input (thread safe)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.path, "a", encoding="utf-8")
+        if self._f.tell():
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._f.write("\n")  # after a torn last line: start on a fresh one
+        self._lock = threading.Lock()
+        self._unsynced = 0
+
+    def record(self, pfile, mfile, code: int, msg: str, seconds: float, sha256: Optional[str]) -> None:
+        line = json.dumps({
+            "pfile": str(pfile),
+            "mfile": str(mfile),
+            "sha256": sha256,
+            "code": code,
+            "msg": msg,
+            "seconds": round(seconds, 6),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+        with self._lock:
+            self._f.write(line + "\n")
+            self._f.flush()
+            self._unsynced += 1
+            if self._unsynced >= _SYNC_EVERY:
+                os.fsync(self._f.fileno())
+                self._unsynced = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load(path) -> Dict[str, dict]:
+    """Last record per pfile ({} if there is no journal yet)."""
+    records = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn write
+                records[rec["pfile"]] = rec
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def _is_done(rec: Optional[dict], pfile: Path, mfile: Path) -> bool:
+    if not rec or rec["code"] != 0 or rec["mfile"] != str(mfile) or not mfile.is_file():
+        return False
+    try:
+        return rec["sha256"] == _content_hash(pfile)
+    except OSError:
+        return False
+
+
+def pending(jobs: List[Tuple[Path, Path]], records: Dict[str, dict]) -> List[Tuple[Path, Path]]:
+    """Jobs without a successful record for their current content (see module doc)."""
+    return [(pfile, mfile) for pfile, mfile in jobs if not _is_done(records.get(str(pfile)), pfile, mfile)]
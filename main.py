@@ -1,16 +1,17 @@
 #!/usr/bin/env python3
-import subprocess
+import multiprocessing
 import sys
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 from PIL import Image, ImageTk
-from tkinter import Tk, ttk, Frame, Label, StringVar
+from tkinter import Tk, ttk, Frame, Label, StringVar, Text
 from tkinter.filedialog import askopenfilename
 
 
+import cli
 import ptompy
-
-CONFIG_APP_NAME = 'ptompy tool'
-CONFIG_APP_VERSION = 0.2
+import viewer
 
 
 def _set_windows_taskbar_icon():
@@ -42,6 +43,10 @@ class ParseGUI(object):
         self.mainframe = Frame(master)
         self.mainframe.pack(fill='both', expand=True)
         self.pfile = None  # Path to selected .p file; .m path is always pfile.with_suffix('.m')
+        # Background decode of the selected file (started on selection, written by Convert):
+        # (Future of ptompy.prepare, (mtime, size) of the .p it read); replaced when the selection changes
+        self.speculative = None
+        self.viewers = []  # open viewer.Viewer windows; closed before Convert rewrites the file they show
         self.pwd = _app_base()
         # Title: what the app does
         self.title_label = Label(self.mainframe, text="MATLAB/Octave .p → .m")
@@ -89,6 +94,9 @@ class ParseGUI(object):
         self.open_mfile_btn.pack(side="left")
         self.progressbar = ttk.Progressbar(mode="indeterminate")
         self.progressbar.pack_forget()
+        # First lines of the selected file (ptompy.preview), shown right after selection
+        self.preview = Text(self.mainframe, height=12, wrap="none", state="disabled", font="TkFixedFont")
+        self.preview.pack_forget()
 
     def _fit_window_height(self, min_h=130):
         """Resize window height to fit content (status wrap, progress bar, etc.)."""
@@ -107,16 +115,52 @@ class ParseGUI(object):
         self.mfile = self.pfile.with_suffix('.m')
 
         self.filename.set("File: " + self.pfile.name)
+        self.progressbar.stop()  # a Convert of the previous selection is abandoned
+        self.progressbar.pack_forget()
+        self.convert_btn.state(["!disabled"])
         self.status.set("Click Convert to decode and save .m file")
         self.status_label.config(fg='green')
+        self.show_preview()
+        self._speculate()
         self._fit_window_height()
 
+    def _speculate(self):
+        """Start decoding and formatting the selected file in the background (any previous result is dropped)."""
+        pfile, mfile = self.pfile, self.mfile
+        future = Future()
+        self.speculative = (future, _stat_key(pfile))
+        # a dropped decode still runs to the end (threads cannot be stopped); its result is ignored
+        threading.Thread(
+            target=lambda: future.set_result(ptompy.prepare(pfile, mfile)), name="speculative-decode", daemon=True
+        ).start()
+
+    def show_preview(self):
+        """Show the first lines of the selected file (decodes only those, see ptompy.preview)."""
+        try:
+            lines, more = ptompy.preview(self.pfile)
+        except (OSError, ValueError) as e:
+            lines, more = [f"No preview: {e}"], False
+        self.preview.config(state="normal")
+        self.preview.delete("1.0", "end")
+        self.preview.insert("1.0", "\n".join(lines + (["..."] if more else [])))
+        self.preview.config(state="disabled")
+        self.preview.pack(side="top", fill="both", expand=True, pady=(4, 0))
+
     def view_mfile(self):
         if not self.pfile:
             return
         mfile = self.pfile.with_suffix('.m')
         if mfile.exists():
-            subprocess.Popen(["notepad", str(mfile.resolve())])
+            self.viewers = [v for v in self.viewers if v.winfo_exists()]
+            self.viewers.append(viewer.Viewer(self.root, mfile))
+
+    def _close_viewers(self, path):
+        """Close the viewers showing path: the file is about to be rewritten under them."""
+        path = Path(path).resolve()
+        for v in self.viewers:
+            if v.winfo_exists() and v.path.resolve() == path:
+                v.close()
+        self.viewers = [v for v in self.viewers if v.winfo_exists()]
 
     def parse_file(self):
         self.progressbar.pack()
@@ -129,11 +173,11 @@ class ParseGUI(object):
 
         elif self.filename.get() != 'No file selected' and self.pfile.suffix == '.p':
             self.status.set("Decoding... (most files decode in a few seconds)")
-            code, msg = ptompy.parse(self.pfile, self.mfile)
-            self.progressbar.stop()
-            self.progressbar.pack_forget() 
-            self.status.set(f"{msg}")
-            self.status_label.config(fg='red' if code != 0 else 'green')
+            if not self._speculation_usable():
+                self._speculate()
+            self.convert_btn.state(["disabled"])
+            self._finish_convert(self.speculative[0])
+            return
 
         else:
             self.progressbar.stop()
@@ -143,6 +187,40 @@ class ParseGUI(object):
         # endif
         self._fit_window_height()
 
+    def _speculation_usable(self):
+        """False if nothing was prepared, the .p changed since, or the background decode failed (retried)."""
+        if self.speculative is None or self.speculative[1] != _stat_key(self.pfile):
+            return False
+        future = self.speculative[0]
+        return not future.done() or future.result()[2] is not None
+
+    def _finish_convert(self, future):
+        """Write the prepared file once the background decode is done (polled, so the window stays responsive)."""
+        if self.speculative is None or future is not self.speculative[0]:
+            return  # selection changed meanwhile
+        if not future.done():
+            self.root.after(50, self._finish_convert, future)
+            return
+        code, msg, prepared = future.result()
+        if prepared is not None:
+            self._close_viewers(prepared.mfile_data.path)
+            code, msg = ptompy.save(prepared)
+        self.progressbar.stop()
+        self.progressbar.pack_forget()
+        self.convert_btn.state(["!disabled"])
+        self.status.set(f"{msg}")
+        self.status_label.config(fg='red' if code != 0 else 'green')
+        self._fit_window_height()
+
+
+def _stat_key(path):
+    """(mtime, size) of path, to tell whether a prepared result is still current; None if unreadable."""
+    try:
+        st = Path(path).stat()
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
 
 def _logo_from_ico(ico_name, size=(64, 64)):
     """Load .ico and return ImageTk.PhotoImage for panel logo, or None on failure."""
@@ -153,24 +231,10 @@ def _logo_from_ico(ico_name, size=(64, 64)):
     except Exception:
         return None
 
-def info():
-    print("*"*100)
-    print(__doc__ or f"{CONFIG_APP_NAME} - convert Matlab .p to .m")
-    print("Version:      ", f"{CONFIG_APP_NAME} \t{ptom_get_version():.2f}")
-    print("Platform:     ", sys.platform)
-    print("Python:       ", sys.version[:5], 'located at', sys.executable)
-    print("Usage:")
-    print("\t ptompy.exe pfile [mfile]  - convert pfile to mfile (mfile defaults to pfile.m)")
-    print("\t exit - to quit program (when running without args)")
-    print("*"*100)
-
-def ptom_get_version():
-    return CONFIG_APP_VERSION
-
 def main():
     mode = "tui" if len(sys.argv) > 1 else "gui"
-    info()
     if mode == "gui":
+        cli.info()
         _set_windows_taskbar_icon()  # So taskbar shows app icon, not Python, when run as python main.py
         root_widget = Tk()
         win_icon = _icon_path("app")
@@ -182,28 +246,12 @@ def main():
         img_logo = _logo_from_ico(_icon_path("logo"))
         root_widget._panel_logo = img_logo  # keep reference
         Label(root_widget, image=img_logo).place(x=45, y=0)
-        root_widget.wm_title(CONFIG_APP_NAME)
+        root_widget.wm_title(cli.CONFIG_APP_NAME)
         root_widget.geometry('450x130')
         root_widget.resizable(width=False, height=True)
         root_widget.mainloop()
     elif mode == "tui":
-        if not ptompy.init():
-            print("Initialization failed")
-            return
-        if len(sys.argv) in (2, 3) and sys.argv[1] != "--tui":
-            pfile = sys.argv[1]
-            mfile = sys.argv[2] if len(sys.argv) >= 3 else str(Path(pfile).with_suffix('.m'))
-            code, msg = ptompy.parse(pfile, mfile)
-            print(msg)
-            return
-        while True:
-            pfile = input("pfile (or exit): ").strip()
-            if not pfile or pfile.lower() == "exit":
-                break
-            mfile_in = input("mfile (Enter = same name .m): ").strip()
-            mfile = mfile_in if mfile_in else str(Path(pfile).with_suffix('.m'))
-            code, msg = ptompy.parse(pfile, mfile)
-            print(msg)
+        sys.exit(cli.main())
     else:
         print('Running with sample data.')
         print('')
@@ -214,4 +262,5 @@ def main():
         print('Run with default settings')
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # process pools in the frozen build
     main()
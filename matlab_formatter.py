@@ -19,8 +19,556 @@
 
  """
 
+import argparse
+import contextlib
+import io
+import itertools
+import os
 import re
+import shutil
 import sys
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+# line breaks as formatFile reads them (text mode, universal newlines); str.splitlines
+# also breaks at \v, \f, \x1c-\x1e, \x85, U+2028 and U+2029, which may be inside a string
+NEWLINE = re.compile(r"\r\n|\r|\n")
+
+
+def split_lines(text):
+    """Lines of text without line breaks, as formatFile reads them."""
+    lines = NEWLINE.split(text)
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+class LineInfo:
+    """Facts about one line, computed once by Formatter.analyzeLine and shared by
+    formatLine, multilinematrix and cellarray."""
+
+    __slots__ = ("stripped", "matrix", "cell", "comment", "blockclose", "ellipsis")
+
+    def __init__(self, stripped, comment, blockclose, ellipsis):
+        self.stripped = stripped  # line without strings and comments
+        self.matrix = stripped.count("[") - stripped.count("]")
+        self.cell = stripped.count("{") - stripped.count("}")
+        self.comment = comment  # line has a (trailing) comment
+        self.blockclose = blockclose  # starts with ), ] or }
+        self.ellipsis = ellipsis  # has a continuation (...)
+
+
+# whitespace runs and quote runs of a line
+_WS_RUN = re.compile(r"\s+")
+_QUOTE_RUN = re.compile(r"'+")
+_WORD = re.compile(r"\w")
+_BLANK = ("", " ", "")
+
+
+class _Splitter:
+    """Formatter.format of one line, lexed once.
+
+    format splits a part at the token of the first pattern of the cascade
+    (blank, string, comment, number, ..., multiple whitespace) that occurs in it:
+    at the start of the part if the token is there, else at its last occurrence;
+    left and right part are split again. Matching regexes against every part
+    re-reads the rest of the line per token (quadratic in the line length).
+
+    Here the positions where each token can occur are found once per line. A part
+    is a range (lo, hi) of the line plus the blank a split may add on either side
+    (lp, rp); its match is the last position before hi (bisect), checked again
+    only where the token reaches an end of the part, the one place where the part
+    differs from the line. Output and match order are those of the regexes.
+    """
+
+    __slots__ = ("line", "runs", "ends", "found", "finders", "quotes", "comment")
+
+    # where each token can start (lookaheads: overlapping tokens), empty groups
+    # mark the positions of its parts
+    TOKENS = {
+        "dq": re.compile('"'),
+        "comment": re.compile("%"),
+        "num_sc": re.compile(r"(?<!\w)(?=\d+(?:\.\d*)?()[eE][+-]?()\d)"),
+        "num_R": re.compile(r"(?<!\w)(?=\d+()\s*/\s*()\d)"),
+        "incr": re.compile(r"(?=[+-]\s*()[+-])"),
+        "sign": re.compile(r"(?<=[(\[{,;:=*/\s])[+-](?=\w)"),
+        "colon": re.compile(":"),
+        "op_dot": re.compile(r"(?=\.\s*()[+\-*/^]\s*()=)"),
+        "pow_dot": re.compile(r"(?=\.\s*()\^)"),
+        "pow": re.compile(r"\^"),
+        "op_comb": re.compile(r"(?=[.+\-*\\/=<>|&!~^]\s*()[<>=+\-*/&|])"),
+        "not": re.compile("[!~]"),
+        "op": re.compile(r"[+\-*\\/=!~<>|&]"),
+        "func": re.compile(r"(?<=\w)\("),
+        "open": re.compile(r"[(\[{]"),
+        "close": re.compile(r"[)\]}]"),
+        "comma": re.compile("[,;]"),
+        "ellipsis": re.compile(r"(?=\.\.\.)"),
+    }
+    # the same at the start of a part (no character before it)
+    num_sc_at = re.compile(r"\d+(?:\.\d*)?()[eE][+-]?()\d")
+    num_R_at = re.compile(r"\d+()\s*/\s*()\d")
+
+    string_prefix = frozenset("([{,;=+-")
+    string_suffix = frozenset(")}]+-,;")
+
+    def __init__(self, line):
+        self.line = line
+        spans = [m.span() for m in _WS_RUN.finditer(line)]
+        self.runs = [a for a, _ in spans]
+        self.ends = [b for _, b in spans]
+        self.found = {}
+        self.comment = False
+        chars = set(line)
+        finders = []
+        self.quotes = ("'" in chars, '"' in chars)
+        if "'" in chars or '"' in chars:
+            finders.append(self._string)
+        if "%" in chars:
+            finders.append(self._comment)
+        if "e" in chars or "E" in chars:
+            finders.append(self._num_sc)
+        if "/" in chars:
+            finders.append(self._num_R)
+        if "+" in chars or "-" in chars:
+            finders += (self._incr, self._sign)
+        if ":" in chars:
+            finders.append(self._colon)
+        if "." in chars and "=" in chars:
+            finders.append(self._op_dot)
+        if "." in chars and "^" in chars:
+            finders.append(self._pow_dot)
+        if "^" in chars:
+            finders.append(self._pow)
+        if not chars.isdisjoint("<>=+-*/&|"):
+            finders.append(self._op_comb)
+        if "!" in chars or "~" in chars:
+            finders.append(self._not)
+        if not chars.isdisjoint("+-*\\/=!~<>|&"):
+            finders.append(self._op)
+        if "(" in chars:
+            finders.append(self._func)
+        if not chars.isdisjoint("([{"):
+            finders.append(self._open)
+        if not chars.isdisjoint(")]}"):
+            finders.append(self._close)
+        if "," in chars or ";" in chars:
+            finders.append(self._comma)
+        if "..." in line:
+            finders.append(self._ellipsis)
+        if any(b - a > 1 for a, b in spans):
+            finders.append(self._multiws)
+        self.finders = finders
+
+    def format(self):
+        line = self.line
+        out = []
+        stack = [(0, len(line), 0, 0)]
+        while stack:
+            part = stack.pop()
+            if part.__class__ is str:
+                out.append(part)
+                continue
+            m = self.split(*part)
+            if m is None:
+                lo, hi, lp, rp = part
+                out.append(" " * lp + line[lo:hi] + " " * rp)
+            elif m is _BLANK:
+                out.append(" ")
+            else:
+                stack += (m[2], m[1], m[0])
+        return "".join(out)
+
+    def split(self, lo, hi, lp, rp):
+        """(left part, token, right part) of the part, _BLANK or None."""
+        f = self.nonws(lo)
+        if f >= hi:
+            return _BLANK if lp or rp or lo < hi else None
+        for find in self.finders:
+            m = find(lo, hi, lp, rp, f)
+            if m:
+                return m
+        return None
+
+    # positions
+
+    def nonws(self, i):
+        """First non-whitespace position >= i."""
+        k = bisect_right(self.runs, i) - 1
+        return self.ends[k] if k >= 0 and i < self.ends[k] else i
+
+    def prev(self, i):
+        """End of the non-whitespace before position i (the "(.*\\S)" before a token at i)."""
+        k = bisect_right(self.runs, i - 1) - 1
+        return self.runs[k] if k >= 0 and i - 1 < self.ends[k] else i
+
+    def after(self, i, hi, rp, pad):
+        """Right part "\\s*(\\S.*|$)" from position i, behind pad blanks."""
+        x = self.nonws(i)
+        return (x, hi, pad, rp) if x < hi else (hi, hi, pad, 0)
+
+    def tokens(self, name):
+        """(starts, matches) of the token name in the line."""
+        found = self.found.get(name)
+        if found is None:
+            matches = list(self.TOKENS[name].finditer(self.line))
+            found = self.found[name] = ([m.start() for m in matches], matches)
+        return found
+
+    @staticmethod
+    def last(starts, lo, hi):
+        """Index of the last of starts in (lo, hi), or -1."""
+        k = bisect_left(starts, hi) - 1
+        return k if k >= 0 and starts[k] > lo else -1
+
+    # tokens, in the order they are tried; each: the split of the part or None
+
+    def _string(self, lo, hi, lp, rp, f):
+        sq = self._sq(lo, hi, f) if self.quotes[0] else None
+        dq = self._dq(lo, hi, f) if self.quotes[1] else None
+        # the longer string, so that no string inside another one is extracted
+        if dq and (not sq or sq[1] - sq[0] < dq[1] - dq[0]):
+            sq = dq
+        if not sq:
+            return None
+        c, z = sq
+        left = (f, f, 0, 0) if c == f else (lo, c, lp, 0)
+        return (left, self.line[c : z + 1], (z + 1, hi, 0, rp))
+
+    def _string_ends(self, z, hi):
+        """True if a string closed at z may end there: ")}]+-,;", whitespace or end of the part."""
+        return z + 1 == hi or self.line[z + 1] in self.string_suffix or self.line[z + 1].isspace()
+
+    def _prefix(self, c):
+        return self.line[c - 1] in self.string_prefix or self.line[c - 1].isspace()
+
+    def _quotes(self):
+        """Quote runs, per quote where a '...' opened there closes in the line (None:
+        never), the run index of each quote's run and the openings valid in the line."""
+        found = self.found.get("'")
+        if found is None:
+            line = self.line
+            runs = [m.span() for m in _QUOTE_RUN.finditer(line)]
+            close = {}
+            odd = []  # per run: index of the last run of odd length before it
+            last = None
+            for j, (a, b) in enumerate(runs):
+                odd.append(last)
+                if (b - a) % 2:
+                    last = j
+            stop = None  # a scan entering a run of odd length stops at its last quote
+            for a, b in reversed(runs):
+                for c in range(a, b):
+                    close[c] = b - 1 if (b - 1 - c) % 2 else stop
+                if (b - a) % 2:
+                    stop = b - 1
+            valid = [
+                a
+                for a, _ in runs
+                if a
+                and self._prefix(a)
+                and close[a] is not None
+                and close[a] > a + 1
+                and self._string_ends(close[a], len(line))
+            ]
+            found = self.found["'"] = (runs, [a for a, _ in runs], close, odd, valid)
+        return found
+
+    def _sq(self, lo, hi, f):
+        """(opening, closing quote) of the '...' string the part splits at, or None."""
+        line = self.line
+        runs, starts, close, odd, valid = self._quotes()
+
+        def closes(c):
+            # a '...' opened at c, scanned to the end of the part: "''" is a quote
+            z = close[c]
+            if z is not None and z <= hi - 2:
+                return z
+            if line[hi - 1] != "'":
+                return None
+            first = max(lo, runs[bisect_right(starts, hi - 1) - 1][0])
+            n = hi - first if c < first else hi - 1 - c
+            return hi - 1 if n % 2 else None
+
+        def string(c):
+            z = closes(c)
+            return z if z is not None and z > c + 1 and self._string_ends(z, hi) else None
+
+        if line[f] == "'":
+            z = string(f)
+            if z is not None:
+                return (f, z)
+        best = None
+        k = bisect_left(valid, hi) - 1
+        while k >= 0 and valid[k] > f:
+            if close[valid[k]] <= hi - 2:
+                best = valid[k]
+                break
+            k -= 1
+        if line[hi - 1] == "'":
+            # strings that close at the end of the part: the run of quotes there,
+            # or the last run of odd length before it (the others close earlier)
+            j = bisect_right(starts, hi - 1) - 1
+            candidates = [runs[j][0]]
+            if odd[j] is not None:
+                candidates.append(runs[odd[j]][0])
+            for c in candidates:
+                if c > f and (best is None or c > best) and self._prefix(c) and string(c) is not None:
+                    best = c
+        if best is None:
+            return None
+        return (best, string(best))
+
+    def _dq(self, lo, hi, f):
+        """(opening, closing quote) of the "..." string the part splits at, or None."""
+        line = self.line
+        starts, _ = self.tokens("dq")
+        found = self.found.get('"valid')
+        if found is None:
+            n = len(line)
+            found = self.found['"valid'] = [
+                a
+                for a, z in zip(starts, starts[1:])
+                if a and self._prefix(a) and self._string_ends(z, n)
+            ]
+        valid = found
+
+        def closes(c):
+            k = bisect_right(starts, c)
+            return starts[k] if k < len(starts) and starts[k] < hi else None
+
+        if line[f] == '"':
+            z = closes(f)
+            if z is not None and self._string_ends(z, hi):
+                return (f, z)
+        if line[hi - 1] == '"':
+            # the string that closes at the end of the part
+            k = bisect_left(starts, hi - 1) - 1
+            if k >= 0 and starts[k] > f and self._prefix(starts[k]):
+                return (starts[k], hi - 1)
+        k = bisect_left(valid, hi) - 1
+        while k >= 0 and valid[k] > f:
+            z = closes(valid[k])
+            if z is not None and z <= hi - 2:
+                return (valid[k], z)
+            k -= 1
+        return None
+
+    def _comment(self, lo, hi, lp, rp, f):
+        line = self.line
+        if line[f] == "%":
+            c, left = f, (f, f, 0, 1)
+        else:
+            starts, _ = self.tokens("comment")
+            k = self.last(starts, f, hi)
+            if k < 0:
+                return None
+            c = starts[k]
+            left = (lo, self.prev(c), lp, 1)
+        self.comment = True
+        return (left, line[c:hi] + " " * rp, (hi, hi, 0, 0))
+
+    def _number(self, name, at, lo, hi, lp, rp, f):
+        """num_sc, num_R: (left part up to the first group, token, right part from the second)."""
+        line = self.line
+        m = at.match(line, f, hi)
+        if m:
+            left = (f, m.start(1), 0, 0)
+        else:
+            starts, matches = self.tokens(name)
+            k = bisect_left(starts, hi) - 1
+            while k >= 0 and starts[k] > f:
+                if matches[k].start(2) < hi:
+                    m = matches[k]
+                    break
+                k -= 1
+            if m is None:
+                return None
+            left = (lo, m.start(1), lp, 0)
+        a, b = m.start(1), m.start(2)
+        token = "/" if name == "num_R" else line[a:b]
+        return (left, token, (b, hi, 0, rp))
+
+    def _num_sc(self, lo, hi, lp, rp, f):
+        return self._number("num_sc", self.num_sc_at, lo, hi, lp, rp, f)
+
+    def _num_R(self, lo, hi, lp, rp, f):
+        return self._number("num_R", self.num_R_at, lo, hi, lp, rp, f)
+
+    def _incr(self, lo, hi, lp, rp, f):
+        line = self.line
+
+        def followed(c2):
+            # "\s*([)\]},;].*|$)" after the second sign
+            x = self.nonws(c2 + 1)
+            return x if x >= hi or line[x] in ")]},;" else -1
+
+        m = self.TOKENS["incr"].match(line, f, hi)
+        if m and followed(m.start(1)) >= 0:
+            c1, c2, left = f, m.start(1), (f, f, 0, 0)
+        else:
+            c1 = -1
+            # the last two characters of the part, then the ones valid in the line
+            # (what follows them lies in the part)
+            c2 = self.prev(hi) - 1
+            if line[c2] in "+-":
+                c = self.prev(c2) - 1
+                if c > f and line[c] in "+-":
+                    c1 = c
+            if c1 < 0:
+                starts, matches = self.tokens("incr")
+                valid = self.found.get("incr valid")
+                if valid is None:
+                    valid = self.found["incr valid"] = []
+                    for c, m in zip(starts, matches):
+                        x = self.nonws(m.start(1) + 1)
+                        if x >= len(line) or line[x] in ")]},;":
+                            valid.append((c, m.start(1)))
+                k = bisect_left(valid, (c2,)) - 1
+                while k >= 0 and valid[k][0] > f:
+                    if valid[k][1] < c2:
+                        c1, c2 = valid[k]
+                        break
+                    k -= 1
+                if c1 < 0:
+                    return None
+            left = (lo, self.prev(c1), lp, 0)
+        x = followed(c2)
+        right = (x, hi, 0, rp) if x < hi else (hi, hi, 0, 0)
+        return (left, line[c1] + line[c2], right)
+
+    def _sign(self, lo, hi, lp, rp, f):
+        line = self.line
+        starts, _ = self.tokens("sign")
+        k = self.last(starts, lo, hi - 1)
+        if k >= 0:
+            c = starts[k]
+        elif lp and line[lo] in "+-" and _WORD.match(line, lo + 1, hi):
+            c = lo
+        else:
+            return None
+        return ((lo, c, lp, 0), line[c], (c + 1, hi, 0, rp))
+
+    def _single(self, name, chars, lo, hi, lp, rp, f, lpad, rpad):
+        """A one-character token "(^|.*\\S)\\s*(token)\\s*(\\S.*|$)", blanks lpad/rpad around it."""
+        line = self.line
+        if line[f] in chars:
+            c, left = f, (f, f, 0, lpad)
+        else:
+            starts, _ = self.tokens(name)
+            k = self.last(starts, f, hi)
+            if k < 0:
+                return None
+            c = starts[k]
+            left = (lo, self.prev(c), lp, lpad)
+        return (left, line[c], self.after(c + 1, hi, rp, rpad))
+
+    def _colon(self, lo, hi, lp, rp, f):
+        return self._single("colon", ":", lo, hi, lp, rp, f, 0, 0)
+
+    def _pair(self, name, lo, hi, lp, rp, f, lpad, rpad, token):
+        """A token of two characters (or of three, op_dot): the matches of name that end in the part."""
+        line = self.line
+        m = self.TOKENS[name].match(line, f, hi)
+        if m:
+            left = (f, f, 0, lpad)
+        else:
+            starts, matches = self.tokens(name)
+            end = matches and matches[0].lastindex
+            k = bisect_left(starts, hi) - 1
+            while k >= 0 and starts[k] > f:
+                if matches[k].start(end) < hi:
+                    m = matches[k]
+                    break
+                k -= 1
+            if m is None:
+                return None
+            left = (lo, self.prev(m.start()), lp, lpad)
+        return (left, token(m), self.after(m.start(m.lastindex) + 1, hi, rp, rpad))
+
+    def _op_dot(self, lo, hi, lp, rp, f):
+        return self._pair("op_dot", lo, hi, lp, rp, f, 1, 1, lambda m: "." + self.line[m.start(1)] + "=")
+
+    def _pow_dot(self, lo, hi, lp, rp, f):
+        return self._pair("pow_dot", lo, hi, lp, rp, f, 0, 0, lambda m: ".^")
+
+    def _pow(self, lo, hi, lp, rp, f):
+        return self._single("pow", "^", lo, hi, lp, rp, f, 0, 0)
+
+    def _op_comb(self, lo, hi, lp, rp, f):
+        return self._pair(
+            "op_comb", lo, hi, lp, rp, f, 1, 1, lambda m: self.line[m.start()] + self.line[m.start(1)]
+        )
+
+    def _not(self, lo, hi, lp, rp, f):
+        return self._single("not", "!~", lo, hi, lp, rp, f, 1, 0)
+
+    def _op(self, lo, hi, lp, rp, f):
+        return self._single("op", "+-*\\/=!~<>|&", lo, hi, lp, rp, f, 1, 1)
+
+    def _func(self, lo, hi, lp, rp, f):
+        starts, _ = self.tokens("func")
+        k = self.last(starts, lo, hi)
+        if k < 0:
+            return None
+        c = starts[k]
+        return ((lo, c, lp, 0), "(", self.after(c + 1, hi, rp, 0))
+
+    def _open(self, lo, hi, lp, rp, f):
+        line = self.line
+        if not lp and line[lo] in "([{":
+            c = lo
+        else:
+            starts, _ = self.tokens("open")
+            k = self.last(starts, lo - 1, hi)
+            if k < 0:
+                return None
+            c = starts[k]
+        return ((lo, c, lp, 0), line[c], self.after(c + 1, hi, rp, 0))
+
+    def _close(self, lo, hi, lp, rp, f):
+        line = self.line
+        if line[f] in ")]}":
+            c, left = f, (f, f, 0, 0)
+        else:
+            starts, _ = self.tokens("close")
+            k = self.last(starts, f, hi)
+            if k < 0:
+                return None
+            c = starts[k]
+            left = (lo, self.prev(c), lp, 0)
+        return (left, line[c], (c + 1, hi, 0, rp))
+
+    def _comma(self, lo, hi, lp, rp, f):
+        return self._single("comma", ",;", lo, hi, lp, rp, f, 0, 1)
+
+    def _ellipsis(self, lo, hi, lp, rp, f):
+        line = self.line
+        if line.startswith("...", f, hi):
+            c, left = f, (f, f, 0, 1)
+        else:
+            starts, _ = self.tokens("ellipsis")
+            k = self.last(starts, f, hi - 2)
+            if k < 0:
+                return None
+            c = starts[k]
+            left = (lo, self.prev(c), lp, 1)
+        return (left, "...", self.after(c + 3, hi, rp, 1))
+
+    def _multiws(self, lo, hi, lp, rp, f):
+        if lp + f - lo > 1:
+            return ((lo, lo, 0, 0), " ", (f, hi, 0, rp))
+        wide = self.found.get("multiws")
+        if wide is None:
+            wide = self.found["multiws"] = [(a, b) for a, b in zip(self.runs, self.ends) if b - a > 1]
+        k = bisect_left(wide, (hi,)) - 1
+        if k < 0 or wide[k][0] <= f:
+            return None
+        a, b = wide[k]
+        return ((lo, a, lp, 0), " ", (b, hi, 0, rp) if b < hi else (hi, hi, 0, 0))
 
 
 class Formatter:
@@ -46,55 +594,50 @@ class Formatter:
     blockcomment_close = re.compile(r"(^|\s*)%\}\s*$")
     block_close = re.compile(r"\s*[\)\]\}].*$")
 
-    # patterns
-    p_string = re.compile(
-        r"(^|.*[\(\[\{,;=\+\-\s])\s*(\'([^\']|\'\')+\')([\)\}\]\+\-,;].*|\s+.*|$)"
-    )
-    p_string_dq = re.compile(
-        r"(^|.*[\(\[\{,;=\+\-\s])\s*(\"([^\"])*\")([\)\}\]\+\-,;].*|\s+.*|$)"
-    )
-    p_comment = re.compile(r"(^|.*\S)\s*(%.*)")
-    p_blank = re.compile(r"^\s+$")
-    p_num_sc = re.compile(r"(^|.*\W)\s*(\d+\.?\d*)([eE][+-]?)(\d+)(.*)")
-    p_num_R = re.compile(r"(^|.*\W)\s*(\d+)\s*(\/)\s*(\d+)(.*)")
-    p_incr = re.compile(r"(^|.*\S)\s*(\+|\-)\s*(\+|\-)\s*([\)\]\},;].*|$)")
-    p_sign = re.compile(r"(.*[\(\[\{,;:=\*/\s])\s*(\+|\-)(\w.*)")
-    p_colon = re.compile(r"(^|.*\S)\s*(:)\s*(\S.*|$)")
-    p_ellipsis = re.compile(r"(^|.*\S)\s*(\.\.\.)\s*(\S.*|$)")
-    p_op_dot = re.compile(r"(^|.*\S)\s*(\.)\s*(\+|\-|\*|/|\^)\s*(=)\s*(\S.*|$)")
-    p_pow_dot = re.compile(r"(^|.*\S)\s*(\.)\s*(\^)\s*(\S.*|$)")
-    p_pow = re.compile(r"(^|.*\S)\s*(\^)\s*(\S.*|$)")
-    p_op_comb = re.compile(
-        r"(^|.*\S)\s*(\.|\+|\-|\*|\\|/|=|<|>|\||\&|!|~|\^)\s*(<|>|=|\+|\-|\*|/|\&|\|)\s*(\S.*|$)"
-    )
-    p_not = re.compile(r"(^|.*\S)\s*(!|~)\s*(\S.*|$)")
-    p_op = re.compile(r"(^|.*\S)\s*(\+|\-|\*|\\|/|=|!|~|<|>|\||\&)\s*(\S.*|$)")
-    p_func = re.compile(r"(.*\w)(\()\s*(\S.*|$)")
-    p_open = re.compile(r"(^|.*)(\(|\[|\{)\s*(\S.*|$)")
-    p_close = re.compile(r"(^|.*\S)\s*(\)|\]|\})(.*|$)")
-    p_comma = re.compile(r"(^|.*\S)\s*(,|;)\s*(\S.*|$)")
-    p_multiws = re.compile(r"(^|.*\S)(\s{2,})(\S.*|$)")
-
     p_matrixid = re.compile(r"(^|\s*)((\S.*)?)(\[.*$)")
     p_cellid = re.compile(r"(^|\s*)((\S.*)?)(\{.*$)")
 
-    def multilinematrix(self, line):
-        line = self.cleanLineFromStringsAndComments(line)
-        tmp = line.count("[") - line.count("]")
+    # first word of a line (after leading whitespace), used to pick the control handlers
+    p_firstword = re.compile(r"\s*(\w*)")
+    # keyword -> control handlers to try, in the order of the original regex cascade
+    # (a control regex can only match if the line's first word is one of its keywords)
+    ctrl_dispatch = {
+        **{kw: ("_ctrl_1line", "_ctrlstart") for kw in ("if", "while", "for", "try")},
+        **{kw: ("_fcnstart",) for kw in ("function", "classdef")},
+        **{
+            kw: ("_ctrlstart",)
+            for kw in ("parfor", "methods", "properties", "events", "arguments", "enumeration")
+        },
+        "switch": ("_ctrlstart_2",),
+        **{kw: ("_ctrlcont",) for kw in ("elseif", "else", "case", "otherwise", "catch")},
+        **{
+            kw: ("_ctrlend",)
+            for kw in ("end", "endfunction", "endif", "endwhile", "endfor", "endswitch")
+        },
+    }
+    # ctrl_ignore has no word boundary: any line starting with these prefixes
+    ctrl_ignore_prefixes = ("import", "clear")
+    # control handler -> blocks it opens (+1) or closes (-1), for splitPoints
+    block_depth = dict(
+        _ctrl_1line=0, _fcnstart=1, _ctrlstart=1, _ctrlstart_2=1, _ctrlcont=0, _ctrlend=-1
+    )
+
+    def multilinematrix(self, line, info=None):
+        info = info or self.analyzeLine(line)
+        tmp = info.matrix
         if tmp > 0:
-            m = self.p_matrixid.match(line)
+            m = self.p_matrixid.match(info.stripped)
             p = (len(m.group(2)) - self.iwidth / 2) // self.iwidth
             self.matrix = int(max(1, p))
         if tmp < 0:
             self.matrix = 0
         return tmp
 
-    def cellarray(self, line):
-        # clean line from strings and comments
-        line = self.cleanLineFromStringsAndComments(line)
-        tmp = line.count("{") - line.count("}")
+    def cellarray(self, line, info=None):
+        info = info or self.analyzeLine(line)
+        tmp = info.cell
         if tmp > 0:
-            m = self.p_cellid.match(line)
+            m = self.p_cellid.match(info.stripped)
             p = (len(m.group(2)) - self.iwidth / 2) // self.iwidth
             self.cell = int(max(1, p))
         if tmp < 0:
@@ -119,212 +662,137 @@ class Formatter:
         self.iwidth = indentwidth
         self.separateBlocks = separateBlocks
         self.indentMode = indentMode
-
-    def cleanLineFromStringsAndComments(self, line):
-        split = self.extract_string_comment(line)
-        if split:
-            return (
-                self.cleanLineFromStringsAndComments(split[0])
-                + " "
-                + self.cleanLineFromStringsAndComments(split[2])
-            )
+        # per instance: block stacks must not leak from one formatted file to the next
+        self.istep = []
+        self.fstep = []
+
+    # characters that may precede a string literal / follow its closing quote
+    # (as in _Splitter, plus a directly following comment)
+    string_prefix = frozenset("([{,;=+-")
+    string_suffix = frozenset(")}]+-,;%")
+
+    def stripStringsAndComments(self, line):
+        """Single left-to-right scan: replace each string literal by a blank and
+        drop the comment. Returns (stripped line, has comment)."""
+        spans = []  # (start, end, quote) of each string literal
+        n = len(line)
+        comment = n
+        i = 0
+        while i < n:
+            c = line[i]
+            if c == "%":
+                comment = i
+                break
+            if (c == "'" or c == '"') and (
+                i == 0 or line[i - 1] in self.string_prefix or line[i - 1].isspace()
+            ):
+                # closing quote: '' is an escaped quote in '...'; "..." has no escapes
+                j = i + 1
+                if c == "'":
+                    while j < n and (line[j] != "'" or line[j + 1 : j + 2] == "'"):
+                        j += 1 if line[j] != "'" else 2
+                    closed = i + 1 < j < n
+                else:
+                    j = line.find('"', j)
+                    closed = j != -1
+                k = j + 1
+                if closed and (k == n or line[k] in self.string_suffix or line[k].isspace()):
+                    spans.append((i, k, c))
+                    i = k
+                    continue
+            i += 1
+
+        out = []
+        pos = 0
+        for (start, end, _), drop in zip(spans, self._dropgaps(line, spans)):
+            if not drop:
+                out.append(line[pos:start])
+            out.append(" ")
+            pos = end
+        if comment < n:
+            out.append(line[pos:comment].rstrip())
+            out.append("  ")
         else:
-            return line
-
-    # divide string into three parts by extracting and formatting certain
-    # expressions
-
-    def extract_string_comment(self, part):
-        # string
-        m = self.p_string.match(part)
-        m2 = self.p_string_dq.match(part)
-        # choose longer string to avoid extracting subexpressions
-        if m2 and (not m or len(m.group(2)) < len(m2.group(2))):
-            m = m2
-        if m:
-            return (m.group(1), m.group(2), m.group(4))
-
-        # comment
-        m = self.p_comment.match(part)
-        if m:
-            self.iscomment = 1
-            return (m.group(1) + " ", m.group(2), "")
-
-        return 0
-
-    def extract(self, part):
-        # whitespace only
-        m = self.p_blank.match(part)
-        if m:
-            return ("", " ", "")
-
-        # string, comment
-        stringOrComment = self.extract_string_comment(part)
-        if stringOrComment:
-            return stringOrComment
-
-        # decimal number (e.g. 5.6E-3)
-        m = self.p_num_sc.match(part)
-        if m:
-            return (m.group(1) + m.group(2), m.group(3), m.group(4) + m.group(5))
-
-        # rational number (e.g. 1/4)
-        m = self.p_num_R.match(part)
-        if m:
-            return (m.group(1) + m.group(2), m.group(3), m.group(4) + m.group(5))
-
-        # incrementor (++ or --)
-        m = self.p_incr.match(part)
-        if m:
-            return (m.group(1), m.group(2) + m.group(3), m.group(4))
-
-        # signum (unary - or +)
-        m = self.p_sign.match(part)
-        if m:
-            return (m.group(1), m.group(2), m.group(3))
-
-        # colon
-        m = self.p_colon.match(part)
-        if m:
-            return (m.group(1), m.group(2), m.group(3))
-
-        # dot-operator-assignment (e.g. .+=)
-        m = self.p_op_dot.match(part)
-        if m:
-            return (
-                m.group(1) + " ",
-                m.group(2) + m.group(3) + m.group(4),
-                " " + m.group(5),
-            )
-
-        # .power (.^)
-        m = self.p_pow_dot.match(part)
-        if m:
-            return (m.group(1), m.group(2) + m.group(3), m.group(4))
-
-        # power (^)
-        m = self.p_pow.match(part)
-        if m:
-            return (m.group(1), m.group(2), m.group(3))
-
-        # combined operator (e.g. +=, .+, etc.)
-        m = self.p_op_comb.match(part)
-        if m:
-            return (m.group(1) + " ", m.group(2) + m.group(3), " " + m.group(4))
-
-        # not (~ or !)
-        m = self.p_not.match(part)
-        if m:
-            return (m.group(1) + " ", m.group(2), m.group(3))
-
-        # single operator (e.g. +, -, etc.)
-        m = self.p_op.match(part)
-        if m:
-            return (m.group(1) + " ", m.group(2), " " + m.group(3))
-
-        # function call
-        m = self.p_func.match(part)
-        if m:
-            return (m.group(1), m.group(2), m.group(3))
-
-        # parenthesis open
-        m = self.p_open.match(part)
-        if m:
-            return (m.group(1), m.group(2), m.group(3))
-
-        # parenthesis close
-        m = self.p_close.match(part)
-        if m:
-            return (m.group(1), m.group(2), m.group(3))
-
-        # comma/semicolon
-        m = self.p_comma.match(part)
-        if m:
-            return (m.group(1), m.group(2), " " + m.group(3))
-
-        # ellipsis
-        m = self.p_ellipsis.match(part)
-        if m:
-            return (m.group(1) + " ", m.group(2), " " + m.group(3))
-
-        # multiple whitespace
-        m = self.p_multiws.match(part)
-        if m:
-            return (m.group(1), " ", m.group(3))
+            out.append(line[pos:])
+        return ("".join(out), comment < n)
+
+    def _dropgaps(self, line, spans):
+        """For each string literal, whether the blank gap before it is dropped.
+
+        Matches the former recursive extraction (extract_string_comment), which
+        removed the longer of the last '...' / "..." first (or the one opening its
+        part) and dropped the whitespace in front of a string that opened its part.
+        That happens when the previous literal was removed first."""
+        k = len(spans)
+        if not k:
+            return []
+        gapws = []
+        pos = 0
+        for start, end, _ in spans:
+            gapws.append(not line[pos:start].strip())
+            pos = end
+        # a literal closed directly by a comment was only seen after the comment
+        # had been cut off, i.e. after all other literals
+        hi = k - 1 if spans[-1][1] < len(line) and line[spans[-1][1]] == "%" else k
+        last = {"'": [], '"': []}
+        for t, (_, _, q) in enumerate(spans):
+            for quote, idx in last.items():
+                idx.append(t if q == quote else (idx[-1] if idx else -1))
+        order = [k] * k
+        clock = 0
+        parts = [(0, hi)]
+        while parts:
+            lo, hi = parts.pop()
+            if lo >= hi:
+                continue
+            found = {}
+            for quote, idx in last.items():
+                if spans[lo][2] == quote and gapws[lo]:
+                    found[quote] = lo
+                elif idx[hi - 1] >= lo:
+                    found[quote] = idx[hi - 1]
+            sq, dq = found.get("'"), found.get('"')
+            t = sq
+            if dq is not None and (
+                sq is None
+                or spans[sq][1] - spans[sq][0] < spans[dq][1] - spans[dq][0]
+            ):
+                t = dq
+            order[t] = clock
+            clock += 1
+            parts.append((lo, t))
+            parts.append((t + 1, hi))
+        return [
+            gapws[t] and (t == 0 or order[t - 1] < order[t]) for t in range(k)
+        ]
 
-        return 0
+    def cleanLineFromStringsAndComments(self, line):
+        return self.stripStringsAndComments(line)[0]
+
+    def analyzeLine(self, line):
+        stripped, comment = self.stripStringsAndComments(line)
+        return LineInfo(
+            stripped,
+            comment,
+            bool(self.block_close.match(stripped)),
+            "..." in stripped,
+        )
 
-    # recursively format string
+    # format string: split at the tokens of the line (see _Splitter)
     def format(self, part):
-        m = self.extract(part)
-        if m:
-            return self.format(m[0]) + m[1] + self.format(m[2])
-        return part
+        splitter = _Splitter(part)
+        out = splitter.format()
+        if splitter.comment:
+            self.iscomment = 1
+        return out
 
     # compute indentation
     def indent(self, add=0):
         return (self.ilvl + self.continueline + add) * self.iwidth * " "
 
-    # take care of indentation and call format(line)
-    def formatLine(self, line):
-
-        # determine if linecomment
-        if re.match(self.linecomment, line):
-            self.islinecomment = 2
-        else:
-            self.islinecomment = max(0, self.islinecomment - 1)
-
-        # determine if blockcomment
-        if re.match(self.blockcomment_open, line):
-            self.isblockcomment = float("inf")
-        elif re.match(self.blockcomment_close, line):
-            self.isblockcomment = 1
-        else:
-            self.isblockcomment = max(0, self.isblockcomment - 1)
-
-        # find ellipsis
-        self.iscomment = 0
-        strippedline = self.cleanLineFromStringsAndComments(line)
-        if (
-            re.match(self.block_close, strippedline)
-            or self.islinecomment
-            or self.isblockcomment
-        ):
-            self.continueline = 0
-        else:
-            self.continueline = self.longline
-        if (
-            re.match(self.ellipsis, strippedline)
-            and not self.islinecomment
-            and not self.isblockcomment
-        ):
-            self.longline = 1
-        else:
-            self.longline = 0
-
-        # find comments
-        if self.isblockcomment:
-            return (0, line.rstrip())  # don't modify indentation in block comments
-        if self.islinecomment == 2:
-            return (0, self.indent() + line.strip())
-
-        # find imports, clear, etc.
-        m = re.match(self.ctrl_ignore, line)
-        if m:
-            return (0, self.indent() + line.strip())
-
-        # find matrices
-        tmp = self.matrix
-        if self.multilinematrix(line) or tmp:
-            return (0, self.indent(tmp) + self.format(line).strip())
-
-        # find cell arrays
-        tmp = self.cell
-        if self.cellarray(line) or tmp:
-            return (0, self.indent(tmp) + self.format(line).strip())
-
-        # find control structures
-        m = re.match(self.ctrl_1line, line)
+    # control structure handlers: return (offset, line) or None if the regex does not match
+    def _ctrl_1line(self, line):
+        m = self.ctrl_1line.match(line)
         if m:
             return (
                 0,
@@ -338,7 +806,8 @@ class Formatter:
                 + self.format(m.group(6)).strip(),
             )
 
-        m = re.match(self.fcnstart, line)
+    def _fcnstart(self, line):
+        m = self.fcnstart.match(line)
         if m:
             offset = self.indentMode
             self.fstep.append(1)
@@ -349,7 +818,8 @@ class Formatter:
                 self.indent() + m.group(2) + " " + self.format(m.group(3)).strip(),
             )
 
-        m = re.match(self.ctrlstart, line)
+    def _ctrlstart(self, line):
+        m = self.ctrlstart.match(line)
         if m:
             self.istep.append(1)
             return (
@@ -357,7 +827,8 @@ class Formatter:
                 self.indent() + m.group(2) + " " + self.format(m.group(3)).strip(),
             )
 
-        m = re.match(self.ctrlstart_2, line)
+    def _ctrlstart_2(self, line):
+        m = self.ctrlstart_2.match(line)
         if m:
             self.istep.append(2)
             return (
@@ -365,14 +836,16 @@ class Formatter:
                 self.indent() + m.group(2) + " " + self.format(m.group(3)).strip(),
             )
 
-        m = re.match(self.ctrlcont, line)
+    def _ctrlcont(self, line):
+        m = self.ctrlcont.match(line)
         if m:
             return (
                 0,
                 self.indent(-1) + m.group(2) + " " + self.format(m.group(3)).strip(),
             )
 
-        m = re.match(self.ctrlend, line)
+    def _ctrlend(self, line):
+        m = self.ctrlend.match(line)
         if m:
             if len(self.istep) > 0:
                 step = self.istep.pop()
@@ -386,6 +859,64 @@ class Formatter:
                 self.indent(-step) + m.group(2) + " " + self.format(m.group(4)).strip(),
             )
 
+    # take care of indentation and call format(line)
+    def formatLine(self, line):
+        # classify once by first word / character; only '%' lines can be comments
+        word = self.p_firstword.match(line).group(1)
+        iscommentstart = not word and line.lstrip().startswith("%")
+
+        # determine if linecomment
+        if iscommentstart and self.linecomment.match(line):
+            self.islinecomment = 2
+        else:
+            self.islinecomment = max(0, self.islinecomment - 1)
+
+        # determine if blockcomment
+        if iscommentstart and self.blockcomment_open.match(line):
+            self.isblockcomment = float("inf")
+        elif iscommentstart and self.blockcomment_close.match(line):
+            self.isblockcomment = 1
+        else:
+            self.isblockcomment = max(0, self.isblockcomment - 1)
+
+        # find ellipsis
+        info = self.analyzeLine(line)
+        self.iscomment = int(info.comment)
+        if info.blockclose or self.islinecomment or self.isblockcomment:
+            self.continueline = 0
+        else:
+            self.continueline = self.longline
+        if info.ellipsis and not self.islinecomment and not self.isblockcomment:
+            self.longline = 1
+        else:
+            self.longline = 0
+
+        # find comments
+        if self.isblockcomment:
+            return (0, line.rstrip())  # don't modify indentation in block comments
+        if self.islinecomment == 2:
+            return (0, self.indent() + line.strip())
+
+        # find imports, clear, etc.
+        if word.startswith(self.ctrl_ignore_prefixes) and self.ctrl_ignore.match(line):
+            return (0, self.indent() + line.strip())
+
+        # find matrices
+        tmp = self.matrix
+        if self.multilinematrix(line, info) or tmp:
+            return (0, self.indent(tmp) + self.format(line).strip())
+
+        # find cell arrays
+        tmp = self.cell
+        if self.cellarray(line, info) or tmp:
+            return (0, self.indent(tmp) + self.format(line).strip())
+
+        # find control structures
+        for handler in self.ctrl_dispatch.get(word, ()):
+            result = getattr(self, handler)(line)
+            if result:
+                return result
+
         return (0, self.indent() + self.format(line).strip())
 
     # format file from line 'start' to line 'end'
@@ -457,23 +988,42 @@ class Formatter:
         for line in wlines:
             print(line)
 
-    def format_source(self, source, start=1, end=None):
-        """Format MATLAB source string. Returns formatted string (no file I/O)."""
-        rlines = source.splitlines()
-        rlines = rlines[start - 1 : end] if end is not None else rlines[start - 1 :]
-        wlines = []
-
-        if not rlines:
-            return ""
-
-        # get initial indent lvl
-        p = r"(\s*)(.*)"
-        m = re.match(p, rlines[0])
-        if m:
-            self.ilvl = len(m.group(1)) // self.iwidth
-            rlines[0] = m.group(2)
+    # state carried from one line to the next (see getState/setState)
+    def getState(self, blank):
+        return (
+            self.ilvl,
+            tuple(self.istep),
+            tuple(self.fstep),
+            self.matrix,
+            self.cell,
+            self.isblockcomment,
+            self.islinecomment,
+            self.longline,
+            self.continueline,
+            blank,
+        )
 
-        blank = True
+    def setState(self, state):
+        (
+            self.ilvl,
+            istep,
+            fstep,
+            self.matrix,
+            self.cell,
+            self.isblockcomment,
+            self.islinecomment,
+            self.longline,
+            self.continueline,
+            blank,
+        ) = state
+        self.istep = list(istep)
+        self.fstep = list(fstep)
+        return blank
+
+    def formatLines(self, rlines, blank=True):
+        """Format lines (no first-line / trailing-blank handling).
+        Returns (wlines, blank) where blank tells whether the output ended in a blank line."""
+        wlines = []
         for line in rlines:
             if re.match(r"^\s*$", line):
                 if not blank:
@@ -499,6 +1049,28 @@ class Formatter:
                 blank = True
             else:
                 blank = False
+        return wlines, blank
+
+    def format_source(self, source, start=1, end=None, jobs=1):
+        """Format MATLAB source string. Returns formatted string (no file I/O).
+        jobs > 1 formats large sources in parallel (see formatParallel)."""
+        rlines = split_lines(source)
+        rlines = rlines[start - 1 : end] if end is not None else rlines[start - 1 :]
+
+        if not rlines:
+            return ""
+
+        # get initial indent lvl
+        p = r"(\s*)(.*)"
+        m = re.match(p, rlines[0])
+        if m:
+            self.ilvl = len(m.group(1)) // self.iwidth
+            rlines[0] = m.group(2)
+
+        if jobs > 1:
+            wlines = self.formatParallel(rlines, jobs)
+        else:
+            wlines, _ = self.formatLines(rlines)
 
         while wlines and not wlines[-1]:
             wlines.pop()
@@ -508,6 +1080,180 @@ class Formatter:
 
         return "\n".join(wlines)
 
+    def formatStream(self, rlines, batch=64):
+        """Format an iterable of lines lazily, `batch` lines at a time.
+        Yields the lines of format_source's result ("\n".join gives the same string)."""
+        it = iter(rlines)
+        first = next(it, None)
+        if first is None:
+            return
+        # get initial indent lvl
+        m = re.match(r"(\s*)(.*)", first)
+        self.ilvl = len(m.group(1)) // self.iwidth
+        rlines = [m.group(2)]
+        rlines.extend(itertools.islice(it, batch - 1))
+        blank = True
+        blanks = 0  # held back: trailing blank lines are dropped
+        while rlines:
+            wlines, blank = self.formatLines(rlines, blank)
+            for line in wlines:
+                if not line:
+                    blanks += 1
+                    continue
+                for _ in range(blanks):
+                    yield ""
+                blanks = 0
+                yield line
+            rlines = list(itertools.islice(it, batch))
+
+    # parallel formatting: minimum lines per chunk, chunks per worker
+    parallel_min_lines = 5000
+    parallel_chunks_per_job = 4
+
+    def splitPoints(self, rlines, size):
+        """Indices of function/classdef lines at least `size` lines apart with no block
+        open before them (by a scan of first words): places where the indentation state
+        usually resets (checked afterwards, see formatParallel). None in files whose
+        functions have no closing end: their state never resets."""
+        points = []
+        last = depth = 0
+        for i, line in enumerate(rlines):
+            word = self.p_firstword.match(line).group(1)
+            if word in ("function", "classdef") and depth == 0 and i - last >= size:
+                points.append(i)
+                last = i
+            # the handler formatLine would pick: its regex is named without the "_"
+            for handler in self.ctrl_dispatch.get(word, ()):
+                if getattr(self, handler[1:]).match(line):
+                    depth = max(0, depth + self.block_depth[handler])
+                    break
+        return points
+
+    def guessState(self, rlines, i):
+        """State expected before rlines[i] if it starts a new top-level block."""
+        blank = self.separateBlocks or not rlines[i - 1].strip()
+        return (0, (), (), 0, 0, 0, 0, 0, 0, blank)
+
+    def formatParallel(self, rlines, jobs):
+        """Format chunks split at splitPoints in a process pool, each starting from
+        guessState. At the first chunk whose guess differs from the real state at its
+        start (the end state of the previous chunk), no more chunks are dispatched and
+        the rest is formatted serially, so the result is always identical to
+        formatLines. Serial if no split point."""
+        size = max(
+            self.parallel_min_lines,
+            len(rlines) // (jobs * self.parallel_chunks_per_job) + 1,
+        )
+        points = self.splitPoints(rlines, size)
+        if not points:
+            return self.formatLines(rlines)[0]
+
+        bounds = [0] + points + [len(rlines)]
+        settings = (self.iwidth, self.separateBlocks, self.indentMode)
+        guesses = [self.getState(True)]
+        guesses += [self.guessState(rlines, i) for i in points]
+        tasks = [
+            (settings, guesses[n], rlines[bounds[n] : bounds[n + 1]])
+            for n in range(len(guesses))
+        ]
+        wlines = []
+        state = guesses[0]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # at most 2 * jobs chunks in flight, dispatched in order as results come in
+            in_flight = [pool.submit(_formatChunk, task) for task in tasks[: 2 * jobs]]
+            for n in range(len(tasks)):
+                if state != guesses[n]:
+                    # wrong guess: drop the chunks not started, format the rest from the real state
+                    for future in in_flight[n:]:
+                        future.cancel()
+                    blank = self.setState(state)
+                    chunk, blank = self.formatLines(rlines[bounds[n] :], blank)
+                    wlines.extend(chunk)
+                    state = self.getState(blank)
+                    break
+                if n + 2 * jobs < len(tasks):
+                    in_flight.append(pool.submit(_formatChunk, tasks[n + 2 * jobs]))
+                chunk, stderr, state = in_flight[n].result()
+                if stderr:
+                    print(stderr, end="", file=sys.stderr)
+                wlines.extend(chunk)
+        self.setState(state)
+        return wlines
+
+
+def _formatChunk(task):
+    """Process pool worker for Formatter.formatParallel."""
+    (iwidth, separateBlocks, indentMode), state, rlines = task
+    formatter = Formatter(iwidth, separateBlocks, indentMode)
+    blank = formatter.setState(state)
+    stderr = io.StringIO()
+    with contextlib.redirect_stderr(stderr):
+        wlines, blank = formatter.formatLines(rlines, blank)
+    return wlines, stderr.getvalue(), formatter.getState(blank)
+
+
+def _formatFileInPlace(task):
+    """Process pool worker for formatTree: (path, status, lines, message)."""
+    path, settings = task
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        text = data.decode("UTF-8").replace("\r\n", "\n").replace("\r", "\n")
+        lines = len(split_lines(text))
+        # formatted text with final newline, as formatFile prints it
+        formatted = Formatter(*settings).format_source(text) + "\n"
+        if b"\r\n" in data:
+            formatted = formatted.replace("\n", "\r\n")
+        out = formatted.encode("UTF-8")
+        if out == data:
+            return path, "unchanged", lines, ""
+        # atomic replace: readers never see a half-written file
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(out)
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+        return path, "formatted", lines, ""
+    except (OSError, UnicodeDecodeError) as e:
+        return path, "failed", 0, str(e)
+
+
+def formatTree(root, settings, jobs=None, log=print):
+    """
+    Format every *.m below root in place, in `jobs` processes (default: all CPUs).
+    settings: (indentwidth, separateBlocks, indentMode). Returns counts per status.
+    """
+    paths = sorted(str(p) for p in Path(root).rglob("*.m") if p.is_file())
+    tasks = [(path, settings) for path in paths]
+    jobs = jobs or os.cpu_count() or 1
+    counts = dict(formatted=0, unchanged=0, failed=0, lines=0)
+    t0 = time.perf_counter()
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            chunksize = max(1, len(tasks) // (jobs * 8))
+            results = list(pool.map(_formatFileInPlace, tasks, chunksize=chunksize))
+    else:
+        results = [_formatFileInPlace(task) for task in tasks]
+    for path, status, lines, msg in results:
+        counts[status] += 1
+        counts["lines"] += lines
+        if status != "unchanged":
+            log("%s: %s%s" % (path, status, ": " + msg if msg else ""))
+    seconds = time.perf_counter() - t0
+    log(
+        "%d files (%d formatted, %d unchanged, %d failed), %d lines in %.2f s (%.0f lines/s)"
+        % (
+            len(tasks),
+            counts["formatted"],
+            counts["unchanged"],
+            counts["failed"],
+            counts["lines"],
+            seconds,
+            counts["lines"] / seconds if seconds else 0,
+        )
+    )
+    return counts
+
 
 def main():
     options = dict(
@@ -518,29 +1264,47 @@ def main():
         indentMode="all_functions",
     )
     indentModes = dict(all_functions=1, only_nested_functions=-1, classic=0)
-    if len(sys.argv) < 2:
-        usage = "usage: matlab_formatter.py filename [options...]\n"
-        opt = "  OPTIONS:\n"
-        for key in options:
-            val = options[key]
-            key_type = re.match(r"\<class \'(.*)\'\>", str(type(val))).group(1)
-            key_type = key_type.replace("NoneType", "int")
-            opt += "    --%s=%s\n" % (key, key_type)
+    usage = "usage: matlab_formatter.py filename [options...]\n"
+    usage += "       matlab_formatter.py --in-place DIR [--jobs N] [options...]\n"
+    opt = "  OPTIONS:\n"
+    for key in options:
+        val = options[key]
+        key_type = re.match(r"\<class \'(.*)\'\>", str(type(val))).group(1)
+        key_type = key_type.replace("NoneType", "int")
+        opt += "    --%s=%s\n" % (key, key_type)
 
+    if len(sys.argv) < 2:
         print("%s%s" % (usage, opt), file=sys.stderr)
 
     else:
+        args = sys.argv[2:]
+        if sys.argv[1] == "--in-place":
+            parser = argparse.ArgumentParser(
+                prog="matlab_formatter.py --in-place",
+                usage="%(prog)s DIR [--jobs N] [options...]",
+                epilog=opt,
+                formatter_class=argparse.RawDescriptionHelpFormatter,
+                allow_abbrev=False,
+            )
+            parser.add_argument("root", metavar="DIR", help="format every .m below DIR in place")
+            parser.add_argument("--jobs", type=int, metavar="N", help="processes (default: all CPUs)")
+            inplace, args = parser.parse_known_args(args)
+
         settings_from_args = {}
-        for arg in sys.argv[2:]:
-            key, value = arg.split("=")
-            if any(char.isdigit() for char in value):
-                value = int(value)
-            elif value.lower() == "none":
-                value = None
-            elif value.lower() == "true":
-                value = True
-            elif value.lower() == "false":
-                value = False
+        for arg in args:
+            try:
+                key, value = arg.split("=", 1)
+                if any(char.isdigit() for char in value):
+                    value = int(value)
+                elif value.lower() == "none":
+                    value = None
+                elif value.lower() == "true":
+                    value = True
+                elif value.lower() == "false":
+                    value = False
+            except ValueError:  # no "=", or digits that are not an int
+                print("%s%s\nbad option: %s" % (usage, opt, arg), file=sys.stderr)
+                return 2
             settings_from_args[key.strip().replace("--", "")] = value
 
         indent = settings_from_args.get("indentWidth", options["indentWidth"])
@@ -551,9 +1315,13 @@ def main():
             "indentMode", indentModes[str(options["indentMode"])]
         )
 
+        if sys.argv[1] == "--in-place":
+            formatTree(inplace.root, (indent, sep, mode), inplace.jobs)
+            return
+
         formatter = Formatter(indent, sep, mode)
         formatter.formatFile(sys.argv[1], start, end)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+pipeline — stage-pipelined batch conversion. Used by main.py (--batch ... --pipeline).
+
+API: convert_pipelined(jobs, stages, queue_size) → (BatchStats, report).
+
+The stages run concurrently and are connected by bounded queues, so reading the
+next files overlaps with decoding and formatting the current ones:
+
+    read (threads) ─q─> decode (threads) ─q─> format (processes) ─q─> write (threads)
+    .p bytes            _descramble + zlib     bytecode → formatted     .m file
+
+File I/O and zlib release the GIL, so threads are enough for read, decode
+(only the XOR descramble holds it) and write; bytecode decoding and formatting
+are pure Python and run in a process pool.
+The report shows per-stage utilisation and queue occupancy: the stage in front
+of the fullest queue (or with the highest utilisation) is the bottleneck.
+
+Files are scheduled largest first (decompressed size from the .p header), so a
+few huge files do not start last and stretch the run. With max_inflight_bytes,
+a file only enters the pipeline while the decompressed sizes of all files in
+flight stay within that budget (a file larger than the budget runs alone).
+"""
+
+import hashlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import ptompy
+from batch import BatchStats
+
+_DONE = object()  # end of stream marker, one per consumer thread
+
+
+@dataclass
+class Stages:
+    """Workers per stage."""
+    readers: int = 2
+    decoders: int = 2
+    formatters: int = os.cpu_count() or 1
+    writers: int = 1
+
+    @classmethod
+    def parse(cls, text: str) -> "Stages":
+        """From "R,D,F,W" (e.g. "2,2,8,1")."""
+        counts = [max(1, int(n)) for n in text.split(",")]
+        if len(counts) != 4:
+            raise ValueError("expected 4 comma separated worker counts: readers,decoders,formatters,writers")
+        return cls(*counts)
+
+
+class _Item:
+    """One file moving through the pipeline; payload changes per stage, error skips the rest."""
+    __slots__ = ("pfile", "mfile", "cost", "payload", "error", "code", "digest", "started", "names", "ir")
+
+    def __init__(self, pfile: Path, mfile: Path, cost: int = 0):
+        self.pfile = pfile
+        self.mfile = mfile
+        self.cost = cost  # decompressed size from the header, counted against the budget
+        self.payload = None
+        self.error: Optional[str] = None
+        self.code = 0  # as ptompy.parse: 1 error, 2 invalid p-file, 3 write failed
+        self.digest: Optional[str] = None  # sha256 of the .p (journal only)
+        self.started = time.perf_counter()
+        self.names: Optional[list] = None  # name table, from the format stage
+        self.ir: Optional[bytes] = None  # intermediate file contents (ir=True), from the format stage
+
+
+class _ByteBudget:
+    """Bytes in flight: acquire() blocks while adding n would exceed limit (None = no limit)."""
+
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int) -> None:
+        with self._cond:
+            # nothing in flight: admit even a file larger than the whole budget
+            while self.limit is not None and self.used and self.used + n > self.limit:
+                self._cond.wait()
+            self.used += n
+            self.peak = max(self.peak, self.used)
+
+    def release(self, n: int) -> None:
+        with self._cond:
+            self.used -= n
+            self._cond.notify_all()
+
+
+# deflate expands at most ~1032:1, caps bogus header sizes of corrupt files
+_MAX_DEFLATE_RATIO = 1032
+
+
+def _decompressed_size(pfile: Path) -> int:
+    """size_befor_compass from the header; 0 if unreadable (the read/decode stage reports it)."""
+    try:
+        header = ptompy._read_pfile_header(str(pfile))
+        return min(header.size_befor_compass, _MAX_DEFLATE_RATIO * pfile.stat().st_size)
+    except (OSError, ValueError):
+        return 0
+
+
+def schedule(jobs: List[Tuple[Path, Path]]) -> List[Tuple[Path, Path, int]]:
+    """(pfile, mfile, decompressed size), largest first."""
+    sized = [(pfile, mfile, _decompressed_size(pfile)) for pfile, mfile in jobs]
+    sized.sort(key=lambda job: -job[2])
+    return sized
+
+
+class _Stage:
+    """
+    Worker threads that take items from inq, run func on them and pass them on:
+    to outq, or to done for the last stage. Items that already failed skip func.
+    """
+
+    def __init__(self, name: str, func, workers: int, inq: queue.Queue, outq: Optional[queue.Queue] = None, done=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.inq = inq
+        self.outq = outq
+        self.done = done
+        self.busy = 0.0  # seconds spent in func, all workers
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True) for i in range(workers)]
+
+    def start(self) -> None:
+        for t in self._threads:
+            t.start()
+
+    def stop(self) -> None:
+        """Wait until the workers have drained inq (call after everything was put)."""
+        for _ in self._threads:
+            self.inq.put(_DONE)
+        for t in self._threads:
+            t.join()
+
+    def call(self, item: _Item) -> None:
+        """Run func on one item (wrapped by timeline.recording)."""
+        self.func(item)
+
+    def _work(self) -> None:
+        while True:
+            item = self.inq.get()
+            if item is _DONE:
+                return
+            if item.error is None:
+                t0 = time.perf_counter()
+                try:
+                    self.call(item)
+                except Exception as e:
+                    item.error = str(e) or type(e).__name__
+                    item.code = item.code or 1
+                with self._lock:
+                    self.busy += time.perf_counter() - t0
+            if self.outq is not None:
+                self.outq.put(item)
+            else:
+                self.done(item)
+
+
+def _read(item: _Item) -> None:
+    item.payload = item.pfile.read_bytes()
+
+
+def _read_and_hash(item: _Item) -> None:
+    _read(item)
+    item.digest = hashlib.sha256(item.payload).hexdigest()
+
+
+def _decode(item: _Item) -> None:
+    pfile_data = ptompy._parse_pfile_bytes(item.payload, str(item.pfile))
+    uncompressed = None
+    if ptompy._validate_pfile_data(pfile_data):
+        uncompressed = ptompy._uncompress_pfile(pfile_data)
+    if uncompressed is None:
+        item.error = "Invalid p-file or decompression failed."
+        item.code = 2
+        return
+    item.payload = (uncompressed.tokens, uncompressed.buffer)
+
+
+def _write(item: _Item) -> None:
+    item.code = 3  # until written
+    ptompy._write_mfile(ptompy.MFileData(path=str(item.mfile), source=item.payload, names=item.names, ids=None), item.payload)
+    if item.ir is not None:
+        ptompy._write_ir(item.ir, item.mfile.with_suffix(ptompy.IR_SUFFIX))
+    item.code = 0
+
+
+def _format_worker(tokens: list, buffer: bytes, mfile: str, pfile: str, ir: bool = False):
+    """
+    Process pool worker: decompressed bytes → (formatted source, name table, intermediate file or None, spans);
+    (None, None, None, spans) if undecodable. spans: its "decode" and "format" spans (see ptompy._record_task_spans).
+    """
+    pid = os.getpid()
+    start = time.time()
+    mfile_data = ptompy._decode_bytecode_to_source(tokens, memoryview(buffer)[28:], mpath=mfile)
+    decoded = time.time()
+    spans = [("decode", start, decoded, pid, pfile)]
+    if not mfile_data:
+        return None, None, None, spans
+    formatted = ptompy._format_mfile(mfile_data)
+    spans.append(("format", decoded, time.time(), pid, pfile))
+    return formatted, mfile_data.names, ptompy._dump_ir(mfile_data) if ir else None, spans
+
+
+def convert_pipelined(
+    jobs: List[Tuple[Path, Path]],
+    stages: Optional[Stages] = None,
+    queue_size: int = 8,
+    max_inflight_bytes: Optional[int] = None,
+    sample_interval: float = 0.05,
+    log=print,
+    journal=None,
+    index=None,
+    ir: bool = False,
+) -> Tuple[BatchStats, str]:
+    """
+    Convert (pfile, mfile) pairs with the stages running concurrently, largest first.
+    queue_size: capacity of each queue between stages (bounds the number of files in flight).
+    max_inflight_bytes: budget for the decompressed sizes of the files in flight (None = no limit).
+    journal: journal.Journal recording every input's outcome (for --resume).
+    index: symbols.SymbolIndex to record names and functions of every written file in.
+    ir: also save intermediate files next to the outputs (see ptompy.reformat).
+    Returns (stats, report) — report: per-stage utilisation and queue occupancy.
+    """
+    stages = stages or Stages()
+    budget = _ByteBudget(max_inflight_bytes)
+    stats = BatchStats(total=len(jobs), unique=len(jobs))
+    stats_lock = threading.Lock()
+    queues = {name: queue.Queue(maxsize=queue_size) for name in ("read", "decode", "format", "write")}
+
+    def finish(item: _Item) -> None:
+        budget.release(item.cost)
+        if item.error is None:
+            msg = f"Saved to {item.mfile}"
+        else:
+            msg = item.error
+            with stats_lock:
+                stats.failed += 1
+                stats.errors.append((str(item.pfile), msg))
+        if journal:
+            journal.record(item.pfile, item.mfile, item.code, msg, time.perf_counter() - item.started, item.digest)
+        if log:
+            log(f"{item.pfile}: {msg}")
+
+    samples = {name: [] for name in queues}
+    sampled = threading.Event()
+
+    def sample() -> None:
+        while not sampled.wait(sample_interval):
+            for name, q in queues.items():
+                samples[name].append(q.qsize())
+
+    with ProcessPoolExecutor(max_workers=stages.formatters) as pool:
+
+        def format_item(item: _Item) -> None:
+            tokens, buffer = item.payload
+            future = pool.submit(_format_worker, tokens, buffer, str(item.mfile), str(item.pfile), ir)
+            item.payload, item.names, item.ir, spans = future.result()
+            ptompy._record_task_spans(spans)
+            if item.payload is None:
+                item.error = "Invalid p-file or decompression failed."
+                item.code = 2
+
+        def write_item(item: _Item) -> None:
+            _write(item)
+            if index is not None:
+                index.add(item.pfile, item.mfile, item.names, item.payload)
+
+        pipeline = [
+            _Stage("read", _read_and_hash if journal else _read, stages.readers, queues["read"], queues["decode"]),
+            _Stage("decode", _decode, stages.decoders, queues["decode"], queues["format"]),
+            _Stage("format", format_item, stages.formatters, queues["format"], queues["write"]),
+            _Stage("write", write_item, stages.writers, queues["write"], done=finish),
+        ]
+        monitor = threading.Thread(target=sample, name="queue-monitor", daemon=True)
+        t0 = time.perf_counter()
+        monitor.start()
+        for stage in pipeline:
+            stage.start()
+        for pfile, mfile, size in schedule(jobs):
+            budget.acquire(size)
+            queues["read"].put(_Item(pfile, mfile, size))
+        for stage in pipeline:  # in order: a stage's input is complete once the previous one stopped
+            stage.stop()
+        wall = time.perf_counter() - t0
+        sampled.set()
+        monitor.join()
+
+    return stats, _report(pipeline, samples, queue_size, wall, budget)
+
+
+def _report(pipeline: List[_Stage], samples, queue_size: int, wall: float, budget: _ByteBudget) -> str:
+    """Per-stage table: workers, busy time, utilisation, input queue occupancy."""
+    lines = [f"{'stage':<8}{'workers':>8}{'busy s':>9}{'util':>7}{'queue avg':>11}{'max':>6}"]
+    util = {}
+    for stage in pipeline:
+        s = samples[stage.name]
+        avg = sum(s) / len(s) if s else 0.0
+        util[stage.name] = stage.busy / (stage.workers * wall) if wall else 0.0
+        lines.append(
+            f"{stage.name:<8}{stage.workers:>8}{stage.busy:>9.2f}{util[stage.name]:>7.0%}"
+            f"{avg:>7.1f}/{queue_size:<3}{max(s, default=0):>6}"
+        )
+    lines.append(f"wall {wall:.2f} s; busiest stage: {max(util, key=util.get)}")
+    limit = f" of {budget.limit / 2**20:.1f}" if budget.limit is not None else ""
+    lines.append(f"peak decompressed bytes in flight: {budget.peak / 2**20:.1f}{limit} MiB")
+    return "\n".join(lines)
@@ -0,0 +1,149 @@
+"""
+profiling — cProfile/tracemalloc capture for a conversion run. Used by main.py (--profile, --trace-memory).
+
+API: profiled(func, *args, out_base=..., profile=..., trace_memory=...) → (result, report).
+
+While active, the pipeline stages below are wrapped to attribute wall time and
+peak traced memory to each stage. Output files (attach them to bug reports):
+
+    <out_base>.pstats       cProfile stats   (python -m pstats <file>)
+    <out_base>.tracemalloc  tracemalloc snapshot at end of run (tracemalloc.Snapshot.load)
+"""
+
+import cProfile
+import functools
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+
+import ptompy
+from matlab_formatter import Formatter
+
+# (owner, attribute) of each stage, in pipeline order
+STAGES = [
+    (ptompy, "_read_pfile"),
+    (ptompy, "_descramble"),
+    (ptompy, "_uncompress_pfile"),
+    (ptompy, "_decode_bytecode_ids"),
+    (ptompy, "_token_ids_to_parts"),
+    (ptompy, "_format_mfile"),
+    (Formatter, "formatLine"),
+    (ptompy, "_write_mfile"),
+]
+
+
+@dataclass
+class StageStats:
+    """Accumulated cost of one pipeline stage."""
+    calls: int = 0
+    seconds: float = 0.0
+    peak_bytes: int = 0  # peak traced memory above the stage's entry level
+
+
+class _StageRecorder:
+    """Wraps stage functions; tracks time and (if tracing) nested peak memory."""
+
+    def __init__(self, trace_memory: bool):
+        self.trace_memory = trace_memory
+        self.stats: Dict[str, StageStats] = {}
+        self._stack: List[list] = []  # [base_current, peak_so_far] per active stage
+
+    def _enter(self):
+        if not self.trace_memory:
+            return
+        cur, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._stack.append([cur, cur])
+
+    def _exit(self, st: StageStats):
+        if not self.trace_memory:
+            return
+        _, peak = tracemalloc.get_traced_memory()
+        base, peak_so_far = self._stack.pop()
+        peak_so_far = max(peak_so_far, peak)
+        st.peak_bytes = max(st.peak_bytes, peak_so_far - base)
+        if self._stack:
+            self._stack[-1][1] = max(self._stack[-1][1], peak_so_far)
+        tracemalloc.reset_peak()
+
+    def wrap(self, name, func):
+        st = self.stats.setdefault(name, StageStats())
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self._enter()
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                st.seconds += time.perf_counter() - t0
+                st.calls += 1
+                self._exit(st)
+        return wrapper
+
+
+@contextmanager
+def _stage_hooks(recorder: _StageRecorder):
+    """Temporarily replace STAGES with recording wrappers."""
+    saved = []
+    for owner, attr in STAGES:
+        original = owner.__dict__[attr]
+        saved.append((owner, attr, original))
+        name = attr if owner is ptompy else f"{owner.__name__}.{attr}"
+        setattr(owner, attr, recorder.wrap(name, original))
+    try:
+        yield
+    finally:
+        for owner, attr, original in saved:
+            setattr(owner, attr, original)
+
+
+def format_report(stats: Dict[str, StageStats], with_memory: bool = True) -> str:
+    """Human-readable per-stage table."""
+    lines = [f"{'stage':<28}{'calls':>9}{'seconds':>11}" + (f"{'peak KiB':>12}" if with_memory else "")]
+    for name, st in stats.items():
+        row = f"{name:<28}{st.calls:>9}{st.seconds:>11.4f}"
+        if with_memory:
+            row += f"{st.peak_bytes / 1024:>12.1f}"
+        lines.append(row)
+    return "\n".join(lines)
+
+
+def profiled(func, *args, out_base: str, profile: bool = True, trace_memory: bool = False, **kwargs):
+    """
+    Run func(*args, **kwargs) with stage attribution, cProfile and/or tracemalloc.
+    Writes <out_base>.pstats / <out_base>.tracemalloc. Returns (result, report text).
+    """
+    recorder = _StageRecorder(trace_memory)
+    profiler = cProfile.Profile() if profile else None
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with _stage_hooks(recorder):
+            if profiler:
+                profiler.enable()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                if profiler:
+                    profiler.disable()
+        written = []
+        Path(out_base).parent.mkdir(parents=True, exist_ok=True)
+        if profiler:
+            profiler.dump_stats(f"{out_base}.pstats")
+            written.append(f"{out_base}.pstats")
+        if trace_memory:
+            tracemalloc.take_snapshot().dump(f"{out_base}.tracemalloc")
+            written.append(f"{out_base}.tracemalloc")
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    report = format_report(recorder.stats, with_memory=trace_memory)
+    if written:
+        report += "\nWrote: " + ", ".join(written)
+    return result, report
@@ -1,7 +1,12 @@
 """
 ptompy — convert MATLAB .p (p-code) files to .m source. Python port of ptom.c.
 
-API: init(), parse(pfile, mfile) → (code, msg). Used by main.py.
+API: init(), parse(pfile, mfile) → (code, msg), convert_bytes(data) → (code, msg, source),
+reformat(irfile, mfile, settings) → (code, msg), iter_mfile_lines(pfile) → formatted lines (streamed),
+preview(pfile, max_lines) → (first lines, more),
+prepare(pfile, mfile) → (code, msg, prepared) then save(prepared) → (code, msg): parse() in two steps,
+convert_many(inputs, jobs, chunksize) → (pfile, mfile, code, msg) per file.
+Used by cli.py, main.py, batch.py, watch.py, archive.py, pipeline.py, verify.py.
 
 Flow:
 
@@ -24,7 +29,7 @@ Flow:
              |
              v
     +----------------------+
-    | _decode_bytecode_     |  _parse_name_table → _decode_bytecode_tokens
+    | _decode_bytecode_     |  _parse_name_table → _decode_bytecode_ids → _token_ids_to_parts
     | to_source             |
     +--------+-------------+
              |
@@ -37,13 +42,21 @@ Flow:
     .m file
 """
 
+import itertools
+import os
 import struct
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 from dataclasses import dataclass
 import zlib
 
-from matlab_formatter import Formatter as MatlabFormatter
+from matlab_formatter import NEWLINE, Formatter as MatlabFormatter, split_lines
 
 __version__ = "1.0"
 
@@ -122,44 +135,88 @@ def init() -> bool:
 
 @dataclass
 class PFileData:
-    """Parsed .p file header and payload."""
+    """Parsed .p file header and payload (pdata is a view into the file buffer, not a copy)."""
+    __slots__ = ("path", "minor", "scramble", "size_after_compass", "size_befor_compass", "pdata")
     path: str
     minor: bytes
     scramble: int
     size_after_compass: int
     size_befor_compass: int
-    pdata: bytes
+    pdata: memoryview
 
 
 @dataclass
 class UncompressedData:
-    """Decompressed .p file data (tokens and bytecode)."""
+    """Decompressed .p file data (tokens and bytecode); mdata is a suffix view of buffer."""
+    __slots__ = ("tokens", "buffer", "mdata")
     tokens: list
-    mdata: bytes
+    buffer: bytes
+    mdata: memoryview
 
 
 @dataclass
 class MFileData:
-    """Decoded MATLAB source code."""
+    """Decoded MATLAB source code; names is the name table, one list per group (None if unknown)."""
+    __slots__ = ("path", "source", "names", "ids")
     path: str
     source: str
+    names: Optional[list]
+    ids: Optional[array]  # token ids of source (_decode_bytecode_ids), for the intermediate format
 
 
-def _descramble(pfile_data: PFileData) -> bytes:
-    """Undo scramble: XOR pdata (u32 words) with table. Returns descrambled bytes."""
+@dataclass
+class Prepared:
+    """A decoded and formatted file, not yet written (prepare → save)."""
+    __slots__ = ("mfile_data", "formatted")
+    mfile_data: MFileData  # path: the .m file to write
+    formatted: str
+
+
+class ScratchArena:
+    """
+    Reusable byte buffers for batch runs (read + descramble), so converting many
+    files in one process does not allocate fresh payload-sized objects per file.
+    Views returned by get() are valid until the next get() with the same name.
+    """
+    __slots__ = ("_buffers",)
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name: str, size: int) -> memoryview:
+        """Writable view of exactly size bytes from buffer `name` (grown as needed)."""
+        buf = self._buffers.get(name)
+        if buf is None or len(buf) < size:
+            # Fresh bytearray instead of resize: an old view may still be alive (BufferError)
+            buf = bytearray(max(size, 2 * len(buf) if buf else size))
+            self._buffers[name] = buf
+        return memoryview(buf)[:size]
+
+
+def _descramble(pfile_data: PFileData, arena: Optional[ScratchArena] = None):
+    """
+    Undo scramble: XOR pdata (u32 words) with table.
+    Returns descrambled bytes, or a view into arena's "descramble" buffer if given.
+    """
     scramble_number = (pfile_data.scramble >> 12) & 0xFF
     pdata = pfile_data.pdata
     n = len(pdata) // 4
-    words = list(struct.unpack("<%dI" % n, pdata[: n * 4]))
+    fmt = "<%dI" % n
+    words = struct.unpack(fmt, pdata[: n * 4])
     words = [w ^ S_SCRAMBLE_TBL[(i + scramble_number) & 0xFF] for i, w in enumerate(words)]
-    out = struct.pack("<%dI" % n, *words)
-    # Append trailing bytes (payload not always multiple of 4) so zlib gets full stream
-    if len(pdata) > n * 4:
-        out += pdata[n * 4 :]
+    if arena is None:
+        out = struct.pack(fmt, *words)
+        # Append trailing bytes (payload not always multiple of 4) so zlib gets full stream
+        if len(pdata) > n * 4:
+            out += pdata[n * 4 :]
+        return out
+    out = arena.get("descramble", len(pdata))
+    struct.pack_into(fmt, out, 0, *words)
+    out[n * 4 :] = pdata[n * 4 :]
     return out
 
 
-def _read_pfile(ppath: str) -> Optional[PFileData]:
+def _read_pfile(ppath: str, arena: Optional[ScratchArena] = None) -> Optional[PFileData]:
     """
     Read .p file (header + payload). No validation.
     Returns PFileData or None if file missing or < 32 bytes.
@@ -176,18 +233,38 @@ def _read_pfile(ppath: str) -> Optional[PFileData]:
       28       4     size_befor_compass (u32 big-endian); expected size after zlib decompress
       ------   ----
       32       N     pdata (scrambled, zlib-compressed); N = size_after_compass
+
+    With arena, the file is read into its reusable "read" buffer (pdata views it).
     """
     pp = Path(ppath)
     if not pp.exists():
         raise FileNotFoundError(f".p file not found: {ppath}")
-    
-    data = pp.read_bytes()
+
+    if arena is None:
+        data = pp.read_bytes()
+    else:
+        with open(pp, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            data = arena.get("read", size)
+            data = data[: f.readinto(data)]
+    return _parse_pfile_bytes(data, ppath)
+
+
+def _read_pfile_header(ppath: str) -> PFileData:
+    """Header fields only (first 32 bytes; pdata is empty). Cheap sizing for schedulers."""
+    with open(ppath, "rb") as f:
+        return _parse_pfile_bytes(f.read(32), ppath)
+
+
+def _parse_pfile_bytes(data, ppath: str = "") -> PFileData:
+    """Split in-memory .p contents (bytes-like) into header fields and payload view (see _read_pfile)."""
+    data = memoryview(data)
     if len(data) < 32:
         raise ValueError(f".p file has no header (<32 bytes): {ppath}")
     size_after_compass = int.from_bytes(data[24:28], "big")
     # Use full remainder as payload; some .p files have payload longer than header says
     pdata = data[32:]
-    minor = data[6:12]
+    minor = bytes(data[6:12])
     scramble = int.from_bytes(data[12:16], "big")
     size_befor_compass = int.from_bytes(data[28:32], "big")
 
@@ -209,11 +286,11 @@ def _extract_tokens_from_decompressed(data: bytes) -> list:
     return [int.from_bytes(data[i * 4 : i * 4 + 4], "big") for i in range(7)]
 
 
-def _uncompress_pfile(pfile_data: PFileData) -> Optional[UncompressedData]:
+def _uncompress_pfile(pfile_data: PFileData, arena: Optional[ScratchArena] = None) -> Optional[UncompressedData]:
     """
     Descramble and zlib-decompress pdata. Returns UncompressedData or None.
     """
-    decrypted = _descramble(pfile_data)
+    decrypted = _descramble(pfile_data, arena)
     try:
         tmp = zlib.decompress(decrypted)
     except Exception:
@@ -221,63 +298,84 @@ def _uncompress_pfile(pfile_data: PFileData) -> Optional[UncompressedData]:
     if len(tmp) < pfile_data.size_befor_compass:
         return None
     tokens = _extract_tokens_from_decompressed(tmp)
-    mdata = tmp[28:]  # Token data is 7*4 = 28 bytes
-    return UncompressedData(tokens=tokens, mdata=mdata)
+    mdata = memoryview(tmp)[28:]  # Token data is 7*4 = 28 bytes; view, no copy
+    return UncompressedData(tokens=tokens, buffer=tmp, mdata=mdata)
 
 
-def _parse_name_table(tokens: list, mdata: bytes) -> Optional[tuple]:
+def _parse_name_table(tokens: list, mdata) -> Optional[tuple]:
     """
-    Extract and decode the name table from mdata.
+    Extract and decode the name table from mdata (bytes, or a suffix view as in UncompressedData).
     Returns (slot, code_start_pos) where slot is list of decoded names,
     or None if parsing fails.
     """
+    # memoryview has no find(): search the underlying buffer, offset by the view start
+    buf = mdata.obj if isinstance(mdata, memoryview) else mdata
+    base = len(buf) - len(mdata)
     slot = []
-    pos = 0
+    pos = base
     for i in range(7):
         for _ in range(tokens[i]):
-            end = mdata.find(b"\x00", pos)
+            end = buf.find(b"\x00", pos)
             if end == -1:
                 return None
-            slot.append(mdata[pos:end].decode("utf-8", errors="replace"))
+            slot.append(buf[pos:end].decode("utf-8", errors="replace"))
             pos = end + 1
-    return (slot, pos)
+    return (slot, pos - base)
 
 
-def _decode_bytecode_tokens(code: bytes, slot: list) -> Optional[list]:
+def _decode_ids_into(ids: array, code, nslots: int, final: bool = True) -> Optional[int]:
     """
-    Decode bytecode into token strings.
-    Returns list of output parts or None on failure.
+    Append the token ids of bytecode to ids: id < NUM_1BYTE_TOKENS is S_TOKEN[id],
+    else name slot id - NUM_1BYTE_TOKENS. Returns the number of bytes consumed, or
+    None on an unknown code or bad slot ref. final=False: a trailing first byte of a
+    2-byte code is left unconsumed (its second byte is in the next chunk).
     """
     end_ptr = len(code)
-    out_parts = []
+    append = ids.append
     cur = 0
     while cur < end_ptr:
-        if (code[cur] & 0x80) != 0:
-            # 2-byte code (identifier / slot ref)
-            res_id = 128 + 256 * ((code[cur] & 0x7F) - 1) + code[cur + 1]
-            if res_id >= len(slot):
+        c = code[cur]
+        if c & 0x80:
+            # 2-byte code (identifier / slot ref); first byte 0x80 would give a negative ref
+            if cur + 1 == end_ptr:
+                return None if final else cur
+            res_id = 128 + 256 * ((c & 0x7F) - 1) + code[cur + 1]
+            if not 0 <= res_id < nslots:
                 return None
-            name_ptr = slot[res_id]
-            out_parts.append(name_ptr)
-            next_cur = cur + 2
-            # Space only when next is identifier (2-byte) or keyword (1-byte in _NEED_SPACE_AFTER_IDENT)
-            if next_cur < end_ptr and ((code[next_cur] & 0x80) != 0 or code[next_cur] in _NEED_SPACE_AFTER_IDENT):
-                out_parts.append(" ")
-            cur = next_cur
-            continue
-        if code[cur] < NUM_1BYTE_TOKENS:
-            # 1-byte code: index into S_TOKEN (no space added after; spacing only after slot ref above)
-            name_ptr = S_TOKEN[code[cur]]
-            if len(name_ptr) != 0:
-                out_parts.append(name_ptr)
+            append(NUM_1BYTE_TOKENS + res_id)
+            cur += 2
+        elif c < NUM_1BYTE_TOKENS:
+            append(c)
             cur += 1
-            continue
-        # Unknown code
-        return None
+        else:
+            # Unknown code
+            return None
+    return cur
+
+
+def _decode_bytecode_ids(code, nslots: int) -> Optional[array]:
+    """Decode bytecode into token ids (array "H", see _decode_ids_into); None on failure."""
+    ids = array("H")
+    return ids if _decode_ids_into(ids, code, nslots) is not None else None
+
+
+def _token_ids_to_parts(ids, slot: list) -> list:
+    """Token ids → output parts (token strings, names, separating spaces)."""
+    table = S_TOKEN + slot
+    need_space = _NEED_SPACE_AFTER_IDENT
+    out_parts = []
+    append = out_parts.append
+    after_name = False
+    for t in ids:
+        # Space only after a name, before a name or a keyword in _NEED_SPACE_AFTER_IDENT
+        if after_name and (t >= NUM_1BYTE_TOKENS or t in need_space):
+            append(" ")
+        append(table[t])
+        after_name = t >= NUM_1BYTE_TOKENS
     return out_parts
 
 
-def _decode_bytecode_to_source(tokens: list, mdata: bytes, mpath: str = "") -> Optional[MFileData]:
+def _decode_bytecode_to_source(tokens: list, mdata, mpath: str = "") -> Optional[MFileData]:
     """
     Decode decompressed bytecode (name table + token stream) to MATLAB source.
     tokens: list of 7 counts of names per group.
@@ -287,26 +385,272 @@ def _decode_bytecode_to_source(tokens: list, mdata: bytes, mpath: str = "") -> O
 
     slot, code_start = _parse_name_table(tokens, mdata)
     code = mdata[code_start:]
-    
-    out_parts = _decode_bytecode_tokens(code, slot)
-    
-    return MFileData(path=mpath, source="".join(out_parts))
 
+    ids = _decode_bytecode_ids(code, len(slot))
+    if ids is None:
+        return None
+    return _mfile_from_ids(tokens, slot, ids, mpath)
+
+
+def _mfile_from_ids(counts: list, slot: list, ids, mpath: str = "") -> MFileData:
+    """MFileData of a decoded token stream: slot split into the 7 name groups of counts."""
+    names, pos = [], 0
+    for count in counts:
+        names.append(slot[pos : pos + count])
+        pos += count
+    return MFileData(path=mpath, source="".join(_token_ids_to_parts(ids, slot)), names=names, ids=ids)
+
+
+# Decompressed bytes per chunk of the streaming path (_inflate_chunks → TokenDecoder)
+_STREAM_CHUNK = 1 << 16
+
+
+class TokenDecoder:
+    """
+    Incremental bytecode decoder: feed() decompressed data chunk by chunk as it arrives
+    and get the source parts decoded so far. The 28-byte counts header and the name
+    table are parsed once; a 2-byte slot ref split across two chunks waits for its
+    second byte. Raises ValueError on invalid data (close(): on a truncated stream).
+    """
+    __slots__ = ("counts", "slot", "_buf", "_nuls", "_scanned", "_after_name")
+
+    def __init__(self):
+        self.counts: Optional[list] = None  # names per group (header)
+        self.slot: Optional[list] = None  # name table, once complete
+        self._buf = bytearray()  # not yet consumed: header, name table or a split 2-byte code
+        self._nuls = 0  # NUL terminators seen in _buf[:_scanned] (name table)
+        self._scanned = 0
+        self._after_name = False  # last part was a name (spacing, see _token_ids_to_parts)
+
+    def _read_name_table(self) -> bool:
+        """Consume header and name table once complete in _buf; False while more data is needed."""
+        buf = self._buf
+        if self.counts is None:
+            if len(buf) < 28:
+                return False
+            self.counts = _extract_tokens_from_decompressed(buf)
+            del buf[:28]
+        total = sum(self.counts)
+        self._nuls += buf.count(b"\x00", self._scanned)
+        self._scanned = len(buf)
+        if self._nuls < total:
+            return False
+        slot, pos = [], 0
+        for _ in range(total):
+            end = buf.find(b"\x00", pos)
+            slot.append(buf[pos:end].decode("utf-8", errors="replace"))
+            pos = end + 1
+        del buf[:pos]
+        self.slot = slot
+        return True
+
+    def feed(self, data) -> list:
+        """Decode the next chunk; returns the new source parts (join them for text)."""
+        self._buf += data
+        if self.slot is None and not self._read_name_table():
+            return []
+        ids = array("H")
+        used = _decode_ids_into(ids, self._buf, len(self.slot), final=False)
+        if used is None:
+            raise ValueError("Invalid bytecode (unknown code or name reference)")
+        del self._buf[:used]
+        if not ids:
+            return []
+        parts = _token_ids_to_parts(ids, self.slot)
+        if self._after_name and (ids[0] >= NUM_1BYTE_TOKENS or ids[0] in _NEED_SPACE_AFTER_IDENT):
+            parts.insert(0, " ")
+        self._after_name = ids[-1] >= NUM_1BYTE_TOKENS
+        return parts
+
+    def close(self) -> None:
+        """End of data: raises ValueError if it stopped inside the header, name table or a code."""
+        if self.slot is None or self._buf:
+            raise ValueError("Truncated bytecode")
+
+
+def _descramble_pieces(pfile_data: PFileData, size: int = _STREAM_CHUNK):
+    """_descramble, lazily: descrambled pdata in pieces of about size bytes, computed as they are consumed."""
+    scramble_number = (pfile_data.scramble >> 12) & 0xFF
+    pdata = pfile_data.pdata
+    size = max(4, size & ~3)  # whole u32 words, so every piece starts on a table index
+    for start in range(0, len(pdata), size):
+        piece = pdata[start : start + size]
+        n = len(piece) // 4
+        fmt = "<%dI" % n
+        first = start // 4 + scramble_number
+        words = struct.unpack(fmt, piece[: n * 4])
+        yield struct.pack(fmt, *[w ^ S_SCRAMBLE_TBL[(first + i) & 0xFF] for i, w in enumerate(words)]) + piece[n * 4 :]
+
+
+def _inflate_chunks(pfile_data: PFileData, chunk_size: int = _STREAM_CHUNK):
+    """
+    Descramble and inflate pdata, yielding decompressed chunks of at most chunk_size bytes
+    as they come out of zlib. pdata is descrambled only as far as inflated, so a consumer
+    that stops early skips the rest. Raises ValueError on a corrupt, truncated or short stream.
+    """
+    inflater = zlib.decompressobj()
+    pieces = _descramble_pieces(pfile_data, chunk_size)
+    total = 0
+    try:
+        for pending in pieces:
+            while not inflater.eof:
+                chunk = inflater.decompress(pending, chunk_size)
+                pending = inflater.unconsumed_tail
+                if not chunk and not pending:
+                    break  # needs the next piece
+                total += len(chunk)
+                yield chunk
+            if inflater.eof:
+                break
+    except zlib.error as e:
+        raise ValueError(f"Decompression failed: {e}") from None
+    if not inflater.eof or total < pfile_data.size_befor_compass:
+        raise ValueError("Decompression failed: truncated stream")
+
+
+def _iter_source_lines(pfile_data: PFileData, chunk_size: int = _STREAM_CHUNK):
+    """Decoded source lines (as split_lines), produced while the payload is still being inflated."""
+    decoder = TokenDecoder()
+    rest = ""
+    for chunk in _inflate_chunks(pfile_data, chunk_size):
+        text = rest + "".join(decoder.feed(chunk))
+        # the last line may continue in the next chunk (and a final "\r" may be half of "\r\n")
+        half = text.endswith("\r")
+        lines = NEWLINE.split(text[:-1] if half else text)
+        rest = lines.pop() + ("\r" if half else "")
+        yield from lines
+    decoder.close()
+    yield from split_lines(rest)
+
+
+def iter_mfile_lines(pfile: str, settings: Optional[dict] = None, chunk_size: int = _STREAM_CHUNK):
+    """
+    Formatted .m lines of pfile, streamed: inflate, decode and format run chunk by chunk,
+    so the first lines of a big file come out long before it was fully inflated.
+    "\n".join(lines) equals the text parse() writes. Raises ValueError on an invalid p-file.
+    """
+    pfile_data = _read_pfile(pfile)
+    if not pfile_data or not _validate_pfile_data(pfile_data):
+        raise ValueError("Invalid p-file")
+    formatter = MatlabFormatter(**(settings or FORMAT_DEFAULTS))
+    yield from formatter.formatStream(_iter_source_lines(pfile_data, chunk_size))
 
-def _write_mfile(mfile_data: MFileData) -> bool:
-    """Write decoded MATLAB source to file (formatted via matlab_formatter)."""
+
+# preview(): lines shown, and the inflate step (small: a preview stops after the first few)
+PREVIEW_LINES = 40
+_PREVIEW_CHUNK = 1 << 14
+
+
+def preview(pfile: str, max_lines: int = PREVIEW_LINES, settings: Optional[dict] = None) -> Tuple[List[str], bool]:
+    """
+    First max_lines formatted .m lines of pfile, without converting the rest: inflating,
+    descrambling and decoding stop once enough lines are out (iter_mfile_lines).
+    Returns (lines, more) — more: the file has further lines. Raises ValueError on an invalid p-file.
+    """
+    lines = list(itertools.islice(iter_mfile_lines(pfile, settings, _PREVIEW_CHUNK), max_lines + 1))
+    return lines[:max_lines], len(lines) > max_lines
+
+
+# matlab_formatter.Formatter settings of the written .m files (reformat: any others)
+FORMAT_DEFAULTS = {
+    "indentwidth": 4,
+    "separateBlocks": True,
+    "indentMode": 1,  # all_functions
+}
+
+
+def _format_mfile(mfile_data: MFileData, jobs: int = 1, settings: Optional[dict] = None) -> str:
+    """Format decoded MATLAB source (matlab_formatter, FORMAT_DEFAULTS unless settings; jobs > 1: parallel for huge files)."""
+    formatter = MatlabFormatter(**(settings or FORMAT_DEFAULTS))
+    return formatter.format_source(mfile_data.source, jobs=jobs)
+
+
+def _write_mfile(mfile_data: MFileData, formatted: Optional[str] = None) -> bool:
+    """Write decoded MATLAB source to file (formatted via matlab_formatter unless given)."""
     path = Path(mfile_data.path)
     path.parent.mkdir(parents=True, exist_ok=True)
-    formatter = MatlabFormatter(
-        indentwidth=4,
-        separateBlocks=True,
-        indentMode=1,  # all_functions
-    )
-    formatted = formatter.format_source(mfile_data.source)
-    path.write_text(formatted, encoding="utf-8")
+    if formatted is None:
+        formatted = _format_mfile(mfile_data)
+    _replace_text(path, formatted)
     return True
 
 
+def _replace_text(path: Path, text: str) -> None:
+    """
+    Write text to path via a temp file and os.replace: path is never truncated in place,
+    so an output hardlinked to a twin (batch --dedup) gets a new inode instead of
+    overwriting the twin too.
+    """
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _is_unchanged(mfile: str, formatted: str) -> bool:
+    """True if mfile already exists with exactly this content."""
+    path = Path(mfile)
+    try:
+        return path.is_file() and path.read_text(encoding="utf-8") == formatted
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+# Intermediate representation (.mir): decoded, not yet formatted. Little endian:
+#     header   magic b"PMIR", u16 version, u16 0, u32 names per group [7], u32 name bytes, u32 tokens
+#     body     zlib of: the name table (NUL terminated UTF-8) + the token ids (u16 each, _decode_bytecode_ids)
+IR_SUFFIX = ".mir"
+_IR_MAGIC = b"PMIR"
+_IR_VERSION = 1
+_IR_HEADER = struct.Struct("<4sHH7III")
+
+
+def _dump_ir(mfile_data: MFileData) -> bytes:
+    """Intermediate representation of decoded source (needs names and ids)."""
+    names = [name for group in mfile_data.names for name in group]
+    blob = b"".join(name.encode("utf-8") + b"\x00" for name in names)
+    ids = array("H", mfile_data.ids)
+    if sys.byteorder != "little":
+        ids.byteswap()
+    counts = [len(group) for group in mfile_data.names]
+    header = _IR_HEADER.pack(_IR_MAGIC, _IR_VERSION, 0, *counts, len(blob), len(ids))
+    return header + zlib.compress(blob + ids.tobytes())
+
+
+def _load_ir(data, mpath: str = "") -> Optional[MFileData]:
+    """Decoded source from _dump_ir output; None if data is not a valid intermediate file."""
+    if len(data) < _IR_HEADER.size:
+        return None
+    magic, version, _, *counts, blob_len, count = _IR_HEADER.unpack_from(data)
+    if magic != _IR_MAGIC or version != _IR_VERSION:
+        return None
+    try:
+        body = zlib.decompress(data[_IR_HEADER.size :])
+    except zlib.error:
+        return None
+    if len(body) != blob_len + 2 * count:
+        return None
+    slot = [name.decode("utf-8") for name in body[:blob_len].split(b"\x00")[:-1]]
+    ids = array("H", body[blob_len:])
+    if sys.byteorder != "little":
+        ids.byteswap()
+    if len(slot) != sum(counts) or (ids and max(ids) - NUM_1BYTE_TOKENS >= len(slot)):
+        return None
+    return _mfile_from_ids(counts, slot, ids, mpath)
+
+
+def _write_ir(data: bytes, path) -> None:
+    """Save _dump_ir output (atomically: a crash never leaves a torn file)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
 def _validate_pfile_data(pfile_data: PFileData) -> bool:
     """
     Validate parsed p-file data for integrity.
@@ -320,33 +664,222 @@ def _validate_pfile_data(pfile_data: PFileData) -> bool:
     )
 
 
-def parse(pfile: str, mfile: str) -> Tuple[int, str]:
+def _decode_pfile(pfile: str, mfile: str = "", arena: Optional[ScratchArena] = None) -> Optional[MFileData]:
+    """
+    Read, validate, decompress and decode a .p file (no output I/O).
+    Returns MFileData (path=mfile) or None if the p-file is invalid.
+    """
+    return _decode_pfile_data(_read_pfile(pfile, arena), mfile, arena)
+
+
+def _decode_pfile_data(pfile_data: Optional[PFileData], mfile: str = "", arena: Optional[ScratchArena] = None) -> Optional[MFileData]:
+    """Validate, decompress and decode already read p-file data (see _decode_pfile)."""
+    if not pfile_data or not _validate_pfile_data(pfile_data):
+        return None
+
+    # Decompress and extract tokens
+    uncompressed = _uncompress_pfile(pfile_data, arena)
+
+    # Decode bytecode to .m source
+    return _decode_bytecode_to_source(
+        uncompressed.tokens, uncompressed.mdata, mpath=mfile
+    )
+
+
+def convert_bytes(data, name: str = "") -> Tuple[int, str, Optional[str]]:
+    """
+    Convert in-memory .p contents (e.g. an archive member) to formatted .m source.
+    :param name: used in error messages only
+    :return: (code, msg, source) — code as in parse(); source is None on error.
+    """
+    try:
+        mfile_data = _decode_pfile_data(_parse_pfile_bytes(data, name))
+        if not mfile_data:
+            return (2, "Invalid p-file or decompression failed.", None)
+        return (0, "Decoded", _format_mfile(mfile_data))
+    except KeyboardInterrupt:
+        return (1, "Cancelled by user (Ctrl+C)", None)
+    except Exception as e:
+        return (1, str(e), None)
+
+
+def prepare(pfile: str, mfile: str) -> Tuple[int, str, Optional[Prepared]]:
+    """
+    Decode and format pfile in memory, writing nothing (e.g. speculatively, before the user asks).
+    :return: (code, msg, prepared) — code as in parse(); prepared is None on error, else pass it to save().
+    """
+    try:
+        mfile_data = _decode_pfile(pfile, mfile)
+        if not mfile_data:
+            return (2, "Invalid p-file or decompression failed.", None)
+        return (0, "Decoded", Prepared(mfile_data, _format_mfile(mfile_data)))
+    except KeyboardInterrupt:
+        return (1, "Cancelled by user (Ctrl+C)", None)
+    except Exception as e:
+        return (1, str(e), None)
+
+
+def save(prepared: Prepared) -> Tuple[int, str]:
+    """Write a prepare() result to its .m file. :return: (code, msg) as parse()."""
+    mfile = prepared.mfile_data.path
+    try:
+        if not _write_mfile(prepared.mfile_data, prepared.formatted):
+            return (3, "Failed to write .m file.")
+        return (0, f"Saved to {mfile}")
+    except Exception as e:
+        return (3, str(e))
+
+
+def parse(
+    pfile: str,
+    mfile: str,
+    skip_unchanged: bool = False,
+    arena: Optional[ScratchArena] = None,
+    format_jobs: int = 1,
+    index=None,
+    ir: bool = False,
+) -> Tuple[int, str]:
     """
     Convert a MATLAB .p file to .m source.
     :param pfile: Path to the .p (p-code) file
     :param mfile: Path to the output .m file
+    :param skip_unchanged: leave mfile untouched (mtime kept) if it already has the decoded content
+    :param arena: ScratchArena reused across calls (batch mode)
+    :param format_jobs: worker processes for formatting a huge decoded file (identical output)
+    :param index: symbols.SymbolIndex to record the file's names and functions in
+    :param ir: also save the intermediate representation next to mfile (IR_SUFFIX, see reformat)
     :return: (code, msg) — code 0 = success, non-zero = error; msg is displayable in GUI/TUI.
     """
     try:
-        # Read and validate .p file
-        pfile_data = _read_pfile(pfile)
-        if not pfile_data or not _validate_pfile_data(pfile_data):
+        # Read, validate and decode .p file
+        mfile_data = _decode_pfile(pfile, mfile, arena)
+        if not mfile_data:
             return (2, "Invalid p-file or decompression failed.")
 
-        # Decompress and extract tokens
-        uncompressed = _uncompress_pfile(pfile_data)
-
-        # Decode bytecode to .m source
-        mfile_data = _decode_bytecode_to_source(
-            uncompressed.tokens, uncompressed.mdata, mpath=mfile
-        )
-
+        formatted = _format_mfile(mfile_data, format_jobs)
+        if skip_unchanged and _is_unchanged(mfile, formatted):
+            msg = f"Unchanged {mfile}"
         # Write output file
-        if not _write_mfile(mfile_data):
+        elif not _write_mfile(mfile_data, formatted):
             return (3, "Failed to write .m file.")
+        else:
+            msg = f"Saved to {mfile}"
+
+        if ir:
+            _write_ir(_dump_ir(mfile_data), Path(mfile).with_suffix(IR_SUFFIX))
+        if index is not None:
+            index.add(pfile, mfile, mfile_data.names, formatted)
+        return (0, msg)
+    except KeyboardInterrupt:
+        return (1, "Cancelled by user (Ctrl+C)")
+    except Exception as e:
+        return (1, str(e))
+
 
+def reformat(irfile: str, mfile: str, settings: Optional[dict] = None, skip_unchanged: bool = False) -> Tuple[int, str]:
+    """
+    Write mfile from an intermediate file saved by parse(..., ir=True): only the formatting
+    step runs (no read of the .p, descramble, inflate or bytecode decode).
+    :param settings: matlab_formatter.Formatter keyword arguments (default FORMAT_DEFAULTS)
+    :return: (code, msg) as parse(); code 2 = not a valid intermediate file.
+    """
+    try:
+        mfile_data = _load_ir(Path(irfile).read_bytes(), mfile)
+        if not mfile_data:
+            return (2, "Invalid intermediate file.")
+        formatted = _format_mfile(mfile_data, settings=settings)
+        if skip_unchanged and _is_unchanged(mfile, formatted):
+            return (0, f"Unchanged {mfile}")
+        if not _write_mfile(mfile_data, formatted):
+            return (3, "Failed to write .m file.")
         return (0, f"Saved to {mfile}")
     except KeyboardInterrupt:
         return (1, "Cancelled by user (Ctrl+C)")
     except Exception as e:
         return (1, str(e))
+
+
+# convert_many: .p bytes per pool task (many small files share one task, so IPC is paid per chunk)
+_MANY_CHUNK_BYTES = 64 * 1024
+
+
+def _record_task_spans(spans: list) -> None:
+    """
+    Spans (name, start, end, pid, file) a pool task returned, start and end by time.time()
+    in the worker. No-op: timeline.recording replaces it to add them to the trace.
+    """
+
+
+def _convert_chunk(pairs: list) -> Tuple[list, list]:
+    """
+    Pool task of convert_many: parse (pfile, mfile) pairs with one arena
+    → ([(pfile, mfile, code, msg)], spans: one "convert" span per file, see _record_task_spans).
+    """
+    arena = ScratchArena()
+    results, spans = [], []
+    pid = os.getpid()
+    for pfile, mfile in pairs:
+        start = time.time()
+        results.append((pfile, mfile, *parse(pfile, mfile, arena=arena)))
+        spans.append(("convert", start, time.time(), pid, pfile))
+    return results, spans
+
+
+def _chunk_inputs(inputs, chunksize: int):
+    """Consecutive (pfile, mfile) pairs, grouped until their .p files reach chunksize bytes."""
+    chunk, size = [], 0
+    for item in inputs:
+        pfile, mfile = item if isinstance(item, tuple) else (item, Path(item).with_suffix(".m"))
+        chunk.append((str(pfile), str(mfile)))
+        try:
+            size += os.path.getsize(pfile)
+        except OSError:
+            pass  # parse() reports it
+        if size >= chunksize:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+
+def convert_many(inputs, jobs: Optional[int] = None, chunksize: int = _MANY_CHUNK_BYTES, ordered: bool = False):
+    """
+    Convert many .p files in a process pool; yields (pfile, mfile, code, msg) per file
+    (code and msg as parse()).
+    :param inputs: iterable of .p paths (output next to each: .m suffix) or (pfile, mfile) pairs; may be lazy
+    :param jobs: worker processes (default: CPU count; 1 = in this process)
+    :param chunksize: .p bytes per task: small files are grouped, so pickling and IPC are paid per chunk
+    :param ordered: yield in input order instead of completion order
+    Stop iterating (break, or close() the generator) to cancel: queued chunks are dropped,
+    running ones finish first.
+    """
+    chunks = _chunk_inputs(inputs, chunksize)
+    workers = jobs or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            yield from _convert_chunk(chunk)[0]  # spans: parse ran in this process, recorded as it ran
+        return
+    pool = ProcessPoolExecutor(max_workers=workers)
+    in_flight = deque()
+    try:
+        for chunk in chunks:
+            in_flight.append(pool.submit(_convert_chunk, chunk))
+            while len(in_flight) >= 2 * workers:  # bounded: inputs are read only as fast as they convert
+                yield from _next_results(in_flight, ordered)
+        while in_flight:
+            yield from _next_results(in_flight, ordered)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _next_results(in_flight: deque, ordered: bool) -> list:
+    """Results of the oldest chunk (ordered) or of the first chunk to finish; removed from in_flight."""
+    if ordered:
+        fut = in_flight.popleft()
+    else:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        fut = next(f for f in in_flight if f in done)
+        in_flight.remove(fut)
+    results, spans = fut.result()
+    _record_task_spans(spans)
+    return results
@@ -0,0 +1,138 @@
+"""
+shard — split a batch deterministically across machines. Used by main.py (--shard K/N, merge-manifests).
+
+API: parse_spec("K/N") → (k, n), select(jobs, k, n, method) → jobs of shard k,
+write_manifest(path, ...), merge_manifests(paths) → (complete, merged).
+
+Every node runs the same batch command with its own --shard K/N (K = 1..N) and
+computes the same partition from the same input list, no coordination needed:
+
+    hash  stable sha256 of the .p path, modulo N (cheap, balanced by count)
+    size  largest-first bin packing on the decompressed size from the .p headers
+          (balanced by work; every node reads all headers)
+
+Each shard writes a JSON manifest (its inputs, failures, stats and a hash of the
+full input list). merge_manifests checks that all N shards of the same input
+list are present and together cover it, and sums the stats.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import List, Tuple
+
+import pipeline
+from batch import BatchStats
+
+METHODS = ("hash", "size")
+
+
+def parse_spec(spec: str) -> Tuple[int, int]:
+    """"K/N" → (k, n) with 1 <= k <= n."""
+    try:
+        k, n = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"shard must be K/N, got {spec!r}") from None
+    if not 1 <= k <= n:
+        raise ValueError(f"shard {spec!r}: K must be in 1..N")
+    return k, n
+
+
+def _key(pfile: Path) -> str:
+    """Path as given on the command line (same on every node)."""
+    return Path(pfile).as_posix()
+
+
+def input_set_hash(jobs: List[Tuple[Path, Path]]) -> str:
+    """sha256 of the sorted input paths: shards of one run must agree on it."""
+    h = hashlib.sha256()
+    for key in sorted(_key(pfile) for pfile, _ in jobs):
+        h.update(key.encode("utf-8") + b"\n")
+    return h.hexdigest()
+
+
+def select(jobs: List[Tuple[Path, Path]], k: int, n: int, method: str = "hash") -> List[Tuple[Path, Path]]:
+    """The (pfile, mfile) pairs of shard k of n, in input order."""
+    if method == "hash":
+        def shard_of(pfile):
+            return int.from_bytes(hashlib.sha256(_key(pfile).encode("utf-8")).digest()[:8], "big") % n
+        return [job for job in jobs if shard_of(job[0]) == k - 1]
+    if method == "size":
+        # greedy LPT: largest first (ties in input order) into the least loaded bin (ties: lowest)
+        loads = [0] * n
+        mine = set()
+        for pfile, _, size in pipeline.schedule(jobs):
+            b = loads.index(min(loads))
+            loads[b] += size
+            if b == k - 1:
+                mine.add(_key(pfile))
+        return [job for job in jobs if _key(job[0]) in mine]
+    raise ValueError(f"unknown shard method {method!r} (expected one of {METHODS})")
+
+
+def manifest_path(out_dir, k: int, n: int) -> Path:
+    """Default manifest location: OUT/ptompy_shard_K_of_N.json."""
+    return Path(out_dir or ".") / f"ptompy_shard_{k}_of_{n}.json"
+
+
+def write_manifest(path, k: int, n: int, method: str, all_jobs, shard_jobs, stats: BatchStats) -> None:
+    """Record what shard k converted (written once the shard has finished)."""
+    manifest = {
+        "shard": k,
+        "of": n,
+        "method": method,
+        "input_count": len(all_jobs),
+        "input_set_hash": input_set_hash(all_jobs),
+        "inputs": [_key(pfile) for pfile, _ in shard_jobs],
+        "errors": [[p, msg] for p, msg in stats.errors],
+        "stats": {"total": stats.total, "failed": stats.failed, "unique": stats.unique, "fanned_out": stats.fanned_out},
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    tmp.replace(path)
+
+
+def merge_manifests(paths) -> Tuple[bool, dict]:
+    """
+    Combine shard manifests. Returns (complete, merged): complete is False if shards
+    are missing/duplicated, disagree on the input list, or do not cover it.
+    merged["problems"] lists what is wrong.
+    """
+    manifests = [json.loads(Path(p).read_text(encoding="utf-8")) for p in paths]
+    problems = []
+    if not manifests:
+        return False, {"problems": ["no manifests"]}
+    first = manifests[0]
+    for m in manifests[1:]:
+        for field in ("of", "method", "input_count", "input_set_hash"):
+            if m[field] != first[field]:
+                problems.append(f"shard {m['shard']}: {field} differs from shard {first['shard']}")
+    shards = sorted(m["shard"] for m in manifests)
+    for k in range(1, first["of"] + 1):
+        if shards.count(k) != 1:
+            problems.append(f"shard {k}/{first['of']}: {'missing' if k not in shards else 'duplicated'}")
+    inputs = [p for m in manifests for p in m["inputs"]]
+    if len(set(inputs)) != len(inputs):
+        problems.append("some inputs were converted by more than one shard")
+    if len(set(inputs)) != first["input_count"]:
+        problems.append(f"shards cover {len(set(inputs))} of {first['input_count']} inputs")
+
+    stats = BatchStats()
+    for m in manifests:
+        stats.total += m["stats"]["total"]
+        stats.failed += m["stats"]["failed"]
+        stats.unique += m["stats"]["unique"]
+        stats.fanned_out += m["stats"]["fanned_out"]
+        stats.errors.extend((p, msg) for p, msg in m["errors"])
+    merged = {
+        "of": first["of"],
+        "method": first["method"],
+        "input_count": first["input_count"],
+        "input_set_hash": first["input_set_hash"],
+        "shards": shards,
+        "problems": problems,
+        "stats": stats,
+    }
+    return not problems, merged
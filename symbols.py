@@ -0,0 +1,159 @@
+"""
+symbols — SQLite index of the identifiers and functions of converted files. Used by main.py (--index DB, query).
+
+API: SymbolIndex(db).add(pfile, mfile, names, source) / .close(), query(db, name, like) → (refs, defs).
+
+Filled during conversion from what the decoder already has, so lookups never
+re-decode anything:
+
+    names      the .p name table (MFileData.names), one row per name and group
+    functions  `function` lines of the written .m, with their line numbers
+
+Bulk runs use WAL mode and commit every COMMIT_EVERY files in one transaction.
+
+    files(id, pfile, mfile, indexed)
+    names(file_id, grp, name)                  index on name
+    functions(file_id, line, name, signature)  index on name
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+COMMIT_EVERY = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    pfile TEXT UNIQUE NOT NULL,
+    mfile TEXT NOT NULL,
+    indexed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS names (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    grp INTEGER NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS functions (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    line INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    signature TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS names_name ON names(name);
+CREATE INDEX IF NOT EXISTS names_file ON names(file_id);
+CREATE INDEX IF NOT EXISTS functions_name ON functions(name);
+CREATE INDEX IF NOT EXISTS functions_file ON functions(file_id);
+"""
+
+# function [out] = name(args) / function out = name / function name(args); name may be get.Prop
+_FUNCTION = re.compile(r"\s*function\s+(?:(?:\[[^\]]*\]|\w+)\s*=\s*)?([\w.]+)")
+
+
+def functions_of(source: str) -> List[Tuple[int, str, str]]:
+    """(line number, name, signature) of every function line of source."""
+    found = []
+    for lineno, line in enumerate(source.split("\n"), 1):
+        m = _FUNCTION.match(line)
+        if m:
+            found.append((lineno, m.group(1), line.strip()))
+    return found
+
+
+class SymbolIndex:
+    """Writer for the index database (thread safe; one connection, batched commits)."""
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _file_id(self, pfile: str, mfile: str) -> int:
+        """Row for pfile, emptied if it was indexed before (re-conversion)."""
+        row = self._db.execute("SELECT id FROM files WHERE pfile = ?", (pfile,)).fetchone()
+        if row is None:
+            return self._db.execute(
+                "INSERT INTO files (pfile, mfile, indexed) VALUES (?, ?, ?)", (pfile, mfile, time.time())
+            ).lastrowid
+        self._db.execute("DELETE FROM names WHERE file_id = ?", row)
+        self._db.execute("DELETE FROM functions WHERE file_id = ?", row)
+        self._db.execute("UPDATE files SET mfile = ?, indexed = ? WHERE id = ?", (mfile, time.time(), row[0]))
+        return row[0]
+
+    def _added(self) -> None:
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
+
+    def add(self, pfile, mfile, names: Optional[List[List[str]]], source: str) -> None:
+        """Index one converted file: names by name-table group, functions of the written source."""
+        with self._lock:
+            file_id = self._file_id(str(pfile), str(mfile))
+            self._db.executemany(
+                "INSERT INTO names (file_id, grp, name) VALUES (?, ?, ?)",
+                ((file_id, grp, name) for grp, group in enumerate(names or []) for name in group if name),
+            )
+            self._db.executemany(
+                "INSERT INTO functions (file_id, line, name, signature) VALUES (?, ?, ?, ?)",
+                ((file_id, line, name, sig) for line, name, sig in functions_of(source)),
+            )
+            self._added()
+
+    def add_copy(self, src_pfile, pfile, mfile) -> None:
+        """Index pfile as a copy of the already indexed src_pfile (batch --dedup fan-out)."""
+        with self._lock:
+            src = self._db.execute("SELECT id FROM files WHERE pfile = ?", (str(src_pfile),)).fetchone()
+            if src is None:
+                return
+            file_id = self._file_id(str(pfile), str(mfile))
+            self._db.execute(
+                "INSERT INTO names (file_id, grp, name) SELECT ?, grp, name FROM names WHERE file_id = ?",
+                (file_id, src[0]),
+            )
+            self._db.execute(
+                "INSERT INTO functions (file_id, line, name, signature)"
+                " SELECT ?, line, name, signature FROM functions WHERE file_id = ?",
+                (file_id, src[0]),
+            )
+            self._added()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def query(path, name: str, like: bool = False):
+    """
+    Files referencing identifier name (like: SQL LIKE pattern, e.g. "plot%").
+    Returns (refs, defs): refs = [(pfile, mfile, name, [groups])], defs = [(pfile, mfile, line, signature)].
+    """
+    op = "LIKE" if like else "="
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        refs = db.execute(
+            "SELECT f.pfile, f.mfile, n.name, group_concat(n.grp) FROM names n JOIN files f ON f.id = n.file_id"
+            f" WHERE n.name {op} ? GROUP BY f.id, n.name ORDER BY f.pfile",
+            (name,),
+        ).fetchall()
+        defs = db.execute(
+            "SELECT f.pfile, f.mfile, d.line, d.signature FROM functions d JOIN files f ON f.id = d.file_id"
+            f" WHERE d.name {op} ? ORDER BY f.pfile, d.line",
+            (name,),
+        ).fetchall()
+    finally:
+        db.close()
+    refs = [(p, m, n, sorted(int(g) for g in groups.split(","))) for p, m, n, groups in refs]
+    return refs, defs
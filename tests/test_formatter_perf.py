@@ -0,0 +1,163 @@
+"""
+Formatter performance: pathological lines format in time linear in their length.
+
+Run: python -m pytest tests/test_formatter_perf.py
+
+Each generator builds a line of k repeated constructs. A line must format within
+PER_CHAR seconds per character (the regex cascade this replaces took ~100 µs per
+character on a 4000-term sum), and 4× the terms must take well under 16× (quadratic)
+the time. The fuzz test does the same for random token sequences.
+COMMENTS pins the one intended output change of the linear string/comment scan:
+quotes in a trailing comment no longer bring back the '...' or '[' after them.
+
+Parallel formatting (format_source with jobs > 1) must not format a line twice:
+files whose functions have no closing end are not split, and after a wrong guess
+of the state at a split point the rest is formatted once, serially.
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import matlab_formatter  # noqa: E402
+from matlab_formatter import Formatter  # noqa: E402
+
+PER_CHAR = 20e-6
+# time(4k terms) / time(k terms): 4 if linear, 16 if quadratic
+MAX_RATIO = 8
+
+PATHOLOGICAL = {
+    "sum": lambda k: "y = " + " + ".join(f"a{i}" for i in range(k)) + ";",
+    "negative list": lambda k: "v = [" + ", ".join(f"-{i}" for i in range(k)) + "];",
+    "transposes": lambda k: "z = " + "*".join("a'" for _ in range(k)) + ";",
+    "strings": lambda k: "c = {" + ", ".join(f"'s{i}'" for i in range(k)) + "};",
+    "double quoted": lambda k: "c = [" + " ".join(f'"s{i}"' for i in range(k)) + "];",
+    "empty strings": lambda k: "e = " + " + ".join("''" for _ in range(k)),
+    "quote run": lambda k: "q = " + "'" * (2 * k + 1),
+    "escaped quotes": lambda k: "s = '" + "''x" * k + "';",
+    "nested": lambda k: "x = " + "(" * k + "a" + ")" * k + ";",
+    "calls": lambda k: "x = " + "f(" * k + "1" + ")" * k + ";",
+    "wide whitespace": lambda k: "m = [" + "    ".join(str(i) for i in range(k)) + "];",
+    "numbers": lambda k: "n = [" + " ".join(f"{i}.5e-{i % 9}" for i in range(k)) + "];",
+    "ratios": lambda k: "r = [" + ", ".join(f"{i}/{i + 1}" for i in range(k)) + "];",
+    "increments": lambda k: "; ".join(f"a{i}++" for i in range(k)),
+    "comparisons": lambda k: "t = " + " && ".join(f"a{i} >= b{i}" for i in range(k)) + ";",
+    "element-wise": lambda k: "y = " + " .* ".join(f"b{i}.^2" for i in range(k)) + ";",
+    "ellipses": lambda k: "x = " + " ... ".join("a" for _ in range(k)),
+    "comment": lambda k: "x = 1; % " + "a + b " * k,
+}
+
+EXPECTED = [
+    ("y=a+b-c*d/e;", "y = a + b - c * d / e; "),
+    ("v=[-1,-2 ,+3];", "v = [-1, -2, +3]; "),
+    ("s='it''s'+\"dq\";", "s = 'it''s' + \"dq\"; "),
+    ("z=a'*b';", "z = a' * b'; "),
+    ("a(1:end)=x++;", "a(1:end) = x++; "),
+    ("n=1.5e-3*3/4;", "n = 1.5e-3 * 3/4; "),
+    ("c={ 'a' ,  'b' };", "c = {'a', 'b'}; "),
+    ("t=a>=b&&~c;", "t = a >= b && ~c; "),
+    ("m=[1   2\t\t3];", "m = [1 2 3]; "),
+    ("q=x.'+y.*=2;", "q = x.' + y .*= 2; "),
+]
+
+# text after a quoted word in a trailing comment is part of the comment: no continuation,
+# no open matrix (the regex cascade before the linear scan indented the next line)
+COMMENTS = [
+    ("x = 1; % it's 'quoted' ...\ny = 2;", "x = 1; % it's 'quoted' ...\ny = 2;"),
+    ("x = 1; % see 'x' [\ny = 2;", "x = 1; % see 'x' [\ny = 2;"),
+]
+
+TOKENS = [
+    "a", "b1", "x_y", "f", "1", "1.5", ".5", "1e5", "2.5e-3", "3/4", "'s'", "'it''s'", "''",
+    '"dq"', "+", "-", "*", "/", "\\", "^", ".^", ".*", "=", "==", "~=", "~", "<", ">=", "&&",
+    "||", "++", "+=", "(", ")", "[", "]", "{", "}", ",", ";", ":", "...", "%", " ", "  ", "\t",
+    "'", "a'", '"',
+]
+
+
+def format_time(line):
+    """Best of three: seconds Formatter.format takes on line."""
+    best = float("inf")
+    for _ in range(3):
+        formatter = Formatter(4, False, 1)
+        start = time.perf_counter()
+        formatter.format(line)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.parametrize("line, expected", EXPECTED)
+def test_output(line, expected):
+    assert Formatter(4, False, 1).format(line) == expected
+
+
+@pytest.mark.parametrize("source, expected", COMMENTS)
+def test_comment_not_continued(source, expected):
+    assert Formatter(4, True, 1).format_source(source) == expected
+
+
+@pytest.mark.parametrize("name", PATHOLOGICAL)
+def test_time_per_line(name):
+    line = PATHOLOGICAL[name](4000)
+    assert format_time(line) < PER_CHAR * len(line)
+
+
+@pytest.mark.parametrize("name", PATHOLOGICAL)
+def test_scaling(name):
+    make = PATHOLOGICAL[name]
+    small, large = format_time(make(1000)), format_time(make(4000))
+    assert large < MAX_RATIO * small, f"{name}: {small:.4f}s for 1000 terms, {large:.4f}s for 4000"
+
+
+def test_fuzz():
+    rnd = random.Random(34)
+    for _ in range(200):
+        line = "".join(rnd.choice(TOKENS) for _ in range(rnd.randint(1, 2000)))
+        assert format_time(line) < PER_CHAR * len(line) + 1e-3, repr(line[:80])
+
+
+def count_formatted(monkeypatch):
+    """List that gets the number of lines of each Formatter.formatLines call in this process."""
+    calls = []
+    format_lines = Formatter.formatLines
+
+    def counting(self, rlines, blank=True):
+        calls.append(len(rlines))
+        return format_lines(self, rlines, blank)
+
+    monkeypatch.setattr(Formatter, "formatLines", counting)
+    return calls
+
+
+def functions(n, body):
+    return "\n".join(line for i in range(n) for line in (f"function y = f{i}(x)", *body, ""))
+
+
+def test_parallel_no_end(monkeypatch):
+    source = functions(400, ["if x > 0", "y = -x;", "end", "y = y + 1;"])
+    expected = Formatter(4, True, 1).format_source(source)
+    calls = count_formatted(monkeypatch)
+    monkeypatch.setattr(matlab_formatter, "ProcessPoolExecutor", None)  # no pool started
+    formatter = Formatter(4, True, 1)
+    formatter.parallel_min_lines = 100
+    assert formatter.format_source(source, jobs=2) == expected
+    assert calls == [len(source.splitlines())]
+
+
+def test_parallel_wrong_guess(monkeypatch):
+    # the scan for open blocks counts the end in the block comment; formatLine does not
+    source = functions(400, ["%{", "end", "%}"])
+    expected = Formatter(4, True, 1).format_source(source)
+    calls = count_formatted(monkeypatch)
+    formatter = Formatter(4, True, 1)
+    formatter.parallel_min_lines = 100
+    assert formatter.format_source(source, jobs=2) == expected
+    lines = source.splitlines()
+    size = max(formatter.parallel_min_lines, len(lines) // (2 * formatter.parallel_chunks_per_job) + 1)
+    # the first chunk comes from the pool, the rest is formatted here once
+    assert calls == [len(lines) - formatter.splitPoints(lines, size)[0]]
@@ -0,0 +1,156 @@
+"""
+timeline — Chrome Trace Event export of a conversion run. Used by cli.py (--timeline FILE).
+
+API: recording(path) (context manager: record while active, write path at the end).
+
+While active, the stages below are wrapped to record one complete ("X") event per
+call, on the row of the process and thread that ran it, with the .p file in
+args.file. Open the JSON in chrome://tracing or ui.perfetto.dev (both work
+offline) to see idle workers, stragglers and I/O stalls:
+
+    convert     ptompy.parse (one per file; the stages below nest inside)
+    read        ptompy._read_pfile
+    descramble  ptompy._descramble
+    inflate     ptompy._uncompress_pfile (descramble nested)
+    decode      ptompy._decode_bytecode_to_source
+    format      Formatter.format_source
+    write       ptompy._write_mfile
+    <stage>     pipeline stages (read, decode, format, write; one row per stage worker)
+
+Process pool tasks (the pipeline's formatters, --jobs pools) cannot be wrapped
+from here: each returns its own spans with its result (ptompy._record_task_spans),
+timed by the wall clock so they line up with this process's events, and they
+show on one row per worker process:
+
+    convert     one file of --jobs / archive conversion
+    decode      pipeline formatter: decode (format follows on the same row)
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pipeline
+import ptompy
+from matlab_formatter import Formatter
+
+# (owner, attribute, event name) of each recorded function
+SPANS = [
+    (ptompy, "parse", "convert"),
+    (ptompy, "_read_pfile", "read"),
+    (ptompy, "_descramble", "descramble"),
+    (ptompy, "_uncompress_pfile", "inflate"),
+    (ptompy, "_decode_bytecode_to_source", "decode"),
+    (Formatter, "format_source", "format"),
+    (ptompy, "_write_mfile", "write"),
+]
+
+
+class _Timeline:
+    """Collects trace events (list.append is atomic: no lock needed on the hot path)."""
+
+    def __init__(self):
+        self.events = []
+        self.threads = {}  # tid → thread name
+        self.local = threading.local()  # .file: the .p file the current thread works on
+        self.pid = os.getpid()
+        self.workers = set()  # pids of the pool workers that returned spans
+        # the same instant on both clocks: perf_counter for this process, time.time() for workers
+        self.t0, self.wall0 = time.perf_counter(), time.time()
+
+    def add(self, name: str, start: float, end: float) -> None:
+        if os.getpid() != self.pid:
+            return  # forked pool worker: its spans come back with its results
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": (start - self.t0) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": self.pid,
+            "tid": tid,
+        }
+        file = getattr(self.local, "file", None)
+        if file is not None:
+            event["args"] = {"file": file}
+        self.events.append(event)
+
+    def add_task_spans(self, spans: list) -> None:
+        """Spans (name, start, end, pid, file) of a pool task, start and end by time.time() (see ptompy._record_task_spans)."""
+        for name, start, end, pid, file in spans:
+            self.workers.add(pid)
+            self.events.append({
+                "name": name,
+                "ph": "X",
+                "ts": (start - self.wall0) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": pid,
+                "tid": pid,
+                "args": {"file": str(file)},
+            })
+
+    def wrap(self, name: str, func, file_arg: bool = False):
+        """func recording a `name` event per call; file_arg: its first argument is the .p file."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if file_arg:
+                self.local.file = str(args[0])
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, start, time.perf_counter())
+        return wrapper
+
+    def wrap_stage_call(self, func):
+        """pipeline._Stage.call: event named after the stage, for the item's file."""
+        @functools.wraps(func)
+        def call(stage, item):
+            self.local.file = str(item.pfile)
+            start = time.perf_counter()
+            try:
+                return func(stage, item)
+            finally:
+                self.add(stage.name, start, time.perf_counter())
+        return call
+
+    def write(self, path) -> None:
+        pid = self.pid
+        meta = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "ptompy"}}]
+        meta += [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self.threads.items()
+        ]
+        meta += [
+            {"name": "process_name", "ph": "M", "pid": worker, "args": {"name": f"ptompy worker {worker}"}}
+            for worker in sorted(self.workers)
+        ]
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"traceEvents": meta + self.events, "displayTimeUnit": "ms"}), encoding="utf-8")
+
+
+@contextmanager
+def recording(path):
+    """Record the SPANS, pipeline stages and pool task spans while active; write the trace to path on exit."""
+    timeline = _Timeline()
+    saved = []
+    for owner, attr, name in SPANS:
+        saved.append((owner, attr, owner.__dict__[attr]))
+        setattr(owner, attr, timeline.wrap(name, owner.__dict__[attr], file_arg=attr == "parse"))
+    saved.append((pipeline._Stage, "call", pipeline._Stage.call))
+    pipeline._Stage.call = timeline.wrap_stage_call(pipeline._Stage.call)
+    saved.append((ptompy, "_record_task_spans", ptompy._record_task_spans))
+    ptompy._record_task_spans = timeline.add_task_spans
+    try:
+        yield timeline
+    finally:
+        for owner, attr, original in saved:
+            setattr(owner, attr, original)
+        timeline.write(path)
@@ -0,0 +1,139 @@
+"""
+verify — check that .p files decode, without formatting or writing anything. Used by cli.py (--verify).
+
+API: verify_file(pfile) → (category, msg), verify_many(pfiles, jobs) → VerifyStats.
+
+Each file runs the decoder's own checks up to the token stream and stops there
+(formatting is most of a conversion's time). A failure falls in one category:
+
+    read     the file cannot be read
+    header   < 32 bytes, wrong minor version, payload size ≠ size_after_compass (_validate_pfile_data)
+    inflate  the descrambled payload is not a complete zlib stream
+    size     it inflates to fewer bytes than size_befor_compass
+    names    the name table runs past the end of the data
+    tokens   a 2-byte code is cut off, or refers to a slot outside the name table
+
+A file without failure is one ptompy.parse decodes. Every byte < 0x80 is a
+1-byte token (NUM_1BYTE_TOKENS > 0x80), so the token walk only has to look at
+the 2-byte codes: it runs as two regex passes instead of decoding token by token.
+"""
+
+import re
+import sys
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import ptompy
+
+CATEGORIES = ("read", "header", "inflate", "size", "names", "tokens")
+
+# bytecode: 1-byte tokens and 2-byte codes (first byte >= 0x80), nothing cut off at the end
+_BYTECODE = re.compile(rb"(?:[\x00-\x7f]*[\x80-\xff][\x00-\xff])*[\x00-\x7f]*")
+_TWO_BYTE = re.compile(rb"[\x80-\xff][\x00-\xff]")
+# 2-byte code as big-endian u16 → slot ref: code - _SLOT_BASE (see ptompy._decode_ids_into)
+_SLOT_BASE = 0x8080
+
+
+def _check_bytecode(code, nslots: int) -> Optional[str]:
+    """None if every token of code decodes, else what is wrong."""
+    if not _BYTECODE.fullmatch(code):
+        return "token stream ends inside a 2-byte code"
+    refs = array("H", b"".join(_TWO_BYTE.findall(code)))
+    if not refs:
+        return None
+    if sys.byteorder == "little":
+        refs.byteswap()
+    low, high = min(refs) - _SLOT_BASE, max(refs) - _SLOT_BASE
+    if low < 0 or high >= nslots:
+        bad = low if low < 0 else high
+        return f"slot ref {bad} outside the name table ({nslots} names)"
+    return None
+
+
+def verify_file(pfile: str) -> Tuple[Optional[str], str]:
+    """(category, msg) of the first failed check of pfile; (None, "OK") if it decodes."""
+    try:
+        pfile_data = ptompy._read_pfile(pfile)
+    except ValueError as e:
+        return "header", str(e)
+    except OSError as e:
+        return "read", str(e)
+    if not ptompy._validate_pfile_data(pfile_data):
+        if pfile_data.minor != ptompy.S_MINOR_VERSION:
+            return "header", f"minor version {pfile_data.minor!r}, expected {ptompy.S_MINOR_VERSION!r}"
+        return "header", (
+            f"payload {len(pfile_data.pdata)} bytes, header: size_after_compass {pfile_data.size_after_compass},"
+            f" size_befor_compass {pfile_data.size_befor_compass}"
+        )
+    try:
+        data = zlib.decompress(ptompy._descramble(pfile_data))
+    except zlib.error as e:
+        return "inflate", str(e)
+    if len(data) < pfile_data.size_befor_compass:
+        return "size", f"inflated to {len(data)} bytes, header says {pfile_data.size_befor_compass}"
+    counts = ptompy._extract_tokens_from_decompressed(data)
+    mdata = memoryview(data)[28:]
+    table = ptompy._parse_name_table(counts, mdata)
+    if table is None:
+        return "names", f"name table of {sum(counts)} names runs past the end of the data"
+    slot, code_start = table
+    problem = _check_bytecode(mdata[code_start:], len(slot))
+    if problem:
+        return "tokens", problem
+    return None, "OK"
+
+
+@dataclass
+class VerifyStats:
+    """Outcome of a verify run: failures per category."""
+    total: int = 0
+    failures: Dict[str, List[Tuple[str, str]]] = field(default_factory=dict)  # category → [(pfile, msg)]
+
+    @property
+    def failed(self) -> int:
+        return sum(len(f) for f in self.failures.values())
+
+    def add(self, pfile: str, category: Optional[str], msg: str) -> None:
+        self.total += 1
+        if category is not None:
+            self.failures.setdefault(category, []).append((pfile, msg))
+
+    def report(self) -> str:
+        """Failures grouped by category, then the summary line."""
+        lines = []
+        for category in CATEGORIES:
+            failures = self.failures.get(category, [])
+            if failures:
+                lines.append(f"{category}: {len(failures)}")
+                lines.extend(f"  {pfile}: {msg}" for pfile, msg in failures)
+        counts = ", ".join(f"{c} {len(self.failures[c])}" for c in CATEGORIES if c in self.failures)
+        lines.append(f"Verified {self.total - self.failed}/{self.total} files" + (f"; failed: {counts}" if counts else ""))
+        return "\n".join(lines)
+
+
+def _verify_chunk(pfiles: List[str]) -> List[Tuple[Optional[str], str]]:
+    """Pool task: verify_file for each of pfiles."""
+    return [verify_file(pfile) for pfile in pfiles]
+
+
+def verify_many(pfiles: List[str], jobs: int = 1, chunk: int = 32) -> VerifyStats:
+    """Verify pfiles in jobs processes (chunk files per task: one check is far cheaper than the IPC)."""
+    stats = VerifyStats()
+    pfiles = [str(p) for p in pfiles]
+    chunks = [pfiles[i : i + chunk] for i in range(0, len(pfiles), chunk)]
+    if jobs <= 1:
+        results = map(_verify_chunk, chunks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = pool.map(_verify_chunk, chunks)
+    try:
+        for names, outcomes in zip(chunks, results):
+            for pfile, (category, msg) in zip(names, outcomes):
+                stats.add(pfile, category, msg)
+    finally:
+        if jobs > 1:
+            pool.shutdown(wait=True, cancel_futures=True)
+    return stats
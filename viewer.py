@@ -0,0 +1,242 @@
+"""
+viewer — in-app viewer for converted .m files of any size. Used by main.py (GUI "Open m-file").
+
+API: LineIndex(path).lines(first, count) / .find(text, from_line), Viewer(master, path).
+
+The file is never read as a whole: LineIndex records the byte offset of every
+line start (an array of 8-byte ints, built in 1 MiB steps while the window is
+idle) and reads only the lines asked for (seek + read), and the Tk text widget
+only ever holds the lines that are visible. Opening, scrolling and jumping cost
+the same for 100 or 500k lines. Nothing is mapped: a file truncated while it is
+shown reads short, it does not crash the process (SIGBUS).
+
+    file ──> LineIndex (line → offset, bisect offset → line) ──> visible lines ──> tk.Text
+"""
+
+import os
+import re
+import tkinter as tk
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from tkinter import font as tkfont
+from tkinter import ttk
+from typing import List, Optional
+
+_NEWLINE = re.compile(b"\n")
+
+
+class LineIndex:
+    """Line start offsets of a file, built incrementally (index_more / ensure)."""
+
+    CHUNK = 1 << 20  # bytes scanned per index_more() step
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.offsets = array("Q", [0])
+        self._scanned = 0
+
+    def _read(self, start: int, end: int) -> bytes:
+        """Bytes start .. end of the file (fewer if it was truncated meanwhile)."""
+        self._file.seek(start)
+        return self._file.read(max(0, end - start))
+
+    @property
+    def complete(self) -> bool:
+        return self._scanned >= self.size
+
+    def index_more(self, nbytes: int = CHUNK) -> bool:
+        """Index the next nbytes; returns True while there is more to do."""
+        start = self._scanned
+        data = self._read(start, min(start + nbytes, self.size))
+        self.offsets.extend(start + m.end() for m in _NEWLINE.finditer(data))
+        self._scanned = start + len(data)
+        if len(data) < min(nbytes, self.size - start):
+            self.size = self._scanned  # truncated: the file ends here now
+        return not self.complete
+
+    def ensure(self, line: int) -> None:
+        """Index until the start of line + 1 is known (or the end of the file)."""
+        while len(self.offsets) <= line + 1 and not self.complete:
+            self.index_more()
+
+    @property
+    def line_count(self) -> int:
+        """Lines indexed so far (all lines once complete); a final newline does not start a line."""
+        n = len(self.offsets)
+        return n - 1 if self.offsets[-1] == self.size else n
+
+    def estimated_lines(self) -> int:
+        """line_count, extrapolated to the whole file while indexing."""
+        if self.complete or not self._scanned:
+            return self.line_count
+        return max(self.line_count, int(len(self.offsets) * self.size / self._scanned))
+
+    def lines(self, first: int, count: int) -> List[str]:
+        """Text of lines first .. first+count-1 (fewer at the end), without line endings."""
+        self.ensure(first + count)
+        last = min(first + count, self.line_count)
+        if first >= last:
+            return []
+        base = self.offsets[first]
+        data = self._read(base, self.offsets[last] if last < len(self.offsets) else self.size)
+        out = []
+        for i in range(first, last):
+            end = self.offsets[i + 1] if i + 1 < len(self.offsets) else self.size
+            out.append(data[self.offsets[i] - base : end - base].rstrip(b"\r\n").decode("utf-8", errors="replace"))
+        return out
+
+    def line_of(self, offset: int) -> int:
+        """Line containing byte offset."""
+        while self.offsets[-1] <= offset and not self.complete:
+            self.index_more()
+        return bisect_right(self.offsets, offset) - 1
+
+    def find(self, text: str, from_line: int = 0) -> Optional[int]:
+        """First line at or after from_line containing text (wrapping around to the top); None if absent."""
+        needle = text.encode("utf-8")
+        if not needle or not self.size:
+            return None
+        self.ensure(from_line)
+        start = self.offsets[min(from_line, len(self.offsets) - 1)]
+        pos = self._search(needle, start, self.size)
+        if pos == -1:
+            pos = self._search(needle, 0, min(start + len(needle), self.size))
+        return None if pos == -1 else self.line_of(pos)
+
+    def _search(self, needle: bytes, start: int, end: int) -> int:
+        """Offset of the first needle within bytes start .. end, or -1 (read CHUNK bytes at a time)."""
+        for pos in range(start, end, self.CHUNK):
+            # overlap the next chunk by len(needle) - 1: a match may span two chunks
+            data = self._read(pos, min(pos + self.CHUNK + len(needle) - 1, end))
+            i = data.find(needle)
+            if i != -1:
+                return pos + i
+        return -1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Viewer(tk.Toplevel):
+    """Window showing a (huge) text file: scrolling, Ctrl+G go to line, Ctrl+F / F3 find."""
+
+    def __init__(self, master, path):
+        super().__init__(master)
+        self.path = Path(path)
+        self.title(str(path))
+        self.geometry("800x600")
+        self.index = LineIndex(path)
+        self.first = 0  # first visible line
+        self.height = 1  # visible lines
+        self.found: Optional[int] = None
+
+        bar = ttk.Frame(self)
+        bar.pack(side="top", fill="x")
+        ttk.Label(bar, text="Line:").pack(side="left")
+        self.goto_entry = ttk.Entry(bar, width=10)
+        self.goto_entry.pack(side="left")
+        ttk.Label(bar, text="Find:").pack(side="left", padx=(8, 0))
+        self.find_entry = ttk.Entry(bar, width=30)
+        self.find_entry.pack(side="left")
+        ttk.Button(bar, text="Next", command=self.find_next).pack(side="left")
+        self.status = tk.StringVar()
+        ttk.Label(bar, textvariable=self.status).pack(side="right")
+
+        body = ttk.Frame(self)
+        body.pack(side="top", fill="both", expand=True)
+        self.vbar = ttk.Scrollbar(body, orient="vertical", command=self._on_scrollbar)
+        self.vbar.pack(side="right", fill="y")
+        self.gutter = tk.Text(body, width=8, wrap="none", takefocus=0, background="#f0f0f0", borderwidth=0)
+        self.gutter.pack(side="left", fill="y")
+        self.text = tk.Text(body, wrap="none", undo=False)
+        self.text.pack(side="left", fill="both", expand=True)
+        hbar = ttk.Scrollbar(self, orient="horizontal", command=self.text.xview)
+        hbar.pack(side="bottom", fill="x")
+        self.text.configure(xscrollcommand=hbar.set)
+        self.text.tag_configure("found", background="yellow")
+        self._linespace = max(1, tkfont.Font(font=self.text.cget("font")).metrics("linespace"))
+
+        self.text.bind("<Configure>", self._on_resize)
+        for widget in (self.text, self.gutter):
+            widget.bind("<MouseWheel>", lambda e: self._scroll_by(-3 if e.delta > 0 else 3))
+            widget.bind("<Button-4>", lambda e: self._scroll_by(-3))
+            widget.bind("<Button-5>", lambda e: self._scroll_by(3))
+        self.bind("<Prior>", lambda e: self._scroll_by(-self.height))
+        self.bind("<Next>", lambda e: self._scroll_by(self.height))
+        self.bind("<Control-Home>", lambda e: self.goto(0))
+        self.bind("<Control-End>", lambda e: self.goto(self.index.estimated_lines()))
+        self.bind("<Control-g>", lambda e: self.goto_entry.focus_set())
+        self.bind("<Control-f>", lambda e: self.find_entry.focus_set())
+        self.bind("<F3>", lambda e: self.find_next())
+        self.goto_entry.bind("<Return>", self._on_goto)
+        self.find_entry.bind("<Return>", lambda e: self.find_next())
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.after_idle(self._index_step)
+
+    def _index_step(self) -> None:
+        """Index one chunk per idle moment, so the window opens at once."""
+        if self.index.index_more():
+            self.after(1, self._index_step)
+        self.render()
+
+    def _on_resize(self, event) -> None:
+        self.height = max(1, event.height // self._linespace)
+        self.render()
+
+    def _on_scrollbar(self, action, value, unit=None) -> None:
+        if action == "moveto":
+            self.goto(int(float(value) * self.index.estimated_lines()))
+        else:  # "scroll", n, "units" | "pages"
+            self._scroll_by(int(value) * (self.height if unit == "pages" else 1))
+
+    def _scroll_by(self, lines: int) -> str:
+        self.goto(self.first + lines)
+        return "break"
+
+    def _on_goto(self, event=None) -> None:
+        try:
+            self.goto(int(self.goto_entry.get()) - 1)
+        except ValueError:
+            self.bell()
+
+    def goto(self, line: int) -> None:
+        """Show line (0-based) at the top, clamped to the file."""
+        self.index.ensure(line + self.height)
+        self.first = max(0, min(line, self.index.line_count - self.height))
+        self.render()
+
+    def find_next(self) -> None:
+        """Jump to the next line containing the find text (after the last match)."""
+        start = self.found + 1 if self.found is not None else self.first
+        line = self.index.find(self.find_entry.get(), start)
+        if line is None:
+            self.bell()
+            self.status.set("not found")
+            return
+        self.found = line
+        self.goto(line - self.height // 3)
+
+    def render(self) -> None:
+        """Replace the widget contents with the visible lines."""
+        lines = self.index.lines(self.first, self.height)
+        for widget, content in (
+            (self.gutter, "\n".join(str(self.first + i + 1) for i in range(len(lines)))),
+            (self.text, "\n".join(lines)),
+        ):
+            widget.configure(state="normal")
+            widget.delete("1.0", "end")
+            widget.insert("1.0", content)
+            widget.configure(state="disabled")
+        if self.found is not None and self.first <= self.found < self.first + len(lines):
+            row = self.found - self.first + 1
+            self.text.tag_add("found", f"{row}.0", f"{row}.end")
+        total = max(self.index.estimated_lines(), 1)
+        self.vbar.set(self.first / total, min(1.0, (self.first + self.height) / total))
+        more = "" if self.index.complete else "~"
+        self.status.set(f"line {self.first + 1} of {more}{self.index.estimated_lines()}")
+
+    def close(self) -> None:
+        self.index.close()
+        self.destroy()
@@ -0,0 +1,107 @@
+"""
+watch — keep .m files in sync with a directory of .p files. Used by main.py (--watch DIR).
+
+API: watch(root, out_dir, interval, debounce, jobs, stop) — runs until Ctrl+C or stop is set.
+
+Each poll scans root for *.p and compares (mtime, size) with the last converted
+state. A new/changed file is converted once its signature has been stable for
+`debounce` seconds (vendor drops are copied in pieces). Conversions run in a
+small process pool; outputs whose decoded content is unchanged are not
+rewritten (ptompy.parse skip_unchanged), so editor file watchers stay quiet.
+
+    poll ──> changed & stable? ──> pool: ptompy.parse(skip_unchanged=True) ──> log
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import ptompy
+from batch import output_path
+
+Signature = Tuple[int, int]  # (mtime_ns, size)
+
+
+def _scan(root: Path) -> Dict[Path, Signature]:
+    """Current (mtime_ns, size) of every *.p below root."""
+    found = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if not name.endswith(".p"):
+                continue
+            path = Path(dirpath) / name
+            try:
+                st = path.stat()
+            except OSError:
+                continue  # removed between walk and stat
+            found[path] = (st.st_mtime_ns, st.st_size)
+    return found
+
+
+def _convert(pfile: str, mfile: str) -> Tuple[int, str]:
+    """Pool worker: convert without touching an unchanged output."""
+    return ptompy.parse(pfile, mfile, skip_unchanged=True)
+
+
+def watch(
+    root: str,
+    out_dir: Optional[str] = None,
+    interval: float = 1.0,
+    debounce: float = 0.5,
+    jobs: int = 2,
+    stop: Optional[threading.Event] = None,
+    log=print,
+) -> None:
+    """
+    Poll root every `interval` seconds and re-convert added/changed .p files.
+    Files already present at start are converted too (unchanged outputs are skipped).
+    """
+    root_path = Path(root)
+    stop = stop or threading.Event()
+    converted: Dict[Path, Signature] = {}               # signature at last submit
+    pending: Dict[Path, Tuple[Signature, float]] = {}   # changed, waiting to settle
+    in_flight: Dict[Path, Future] = {}
+
+    log(f"Watching {root_path} (Ctrl+C to stop)")
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as pool:
+        try:
+            while not stop.is_set():
+                now = time.monotonic()
+                current = _scan(root_path)
+
+                for path, sig in current.items():
+                    if converted.get(path) == sig:
+                        pending.pop(path, None)
+                        continue
+                    if path in in_flight:
+                        continue  # re-checked once the running conversion finishes
+                    seen = pending.get(path)
+                    if not seen or seen[0] != sig:
+                        pending[path] = (sig, now)  # new or still changing: restart debounce
+                    elif now - seen[1] >= debounce:
+                        del pending[path]
+                        converted[path] = sig
+                        mfile = output_path(path, root_path, out_dir)
+                        in_flight[path] = pool.submit(_convert, str(path), str(mfile))
+
+                for gone in set(converted) - set(current):
+                    del converted[gone]
+                for gone in set(pending) - set(current):
+                    del pending[gone]
+
+                for path, fut in list(in_flight.items()):
+                    if not fut.done():
+                        continue
+                    del in_flight[path]
+                    try:
+                        code, msg = fut.result()
+                    except Exception as e:
+                        code, msg = 1, str(e)
+                    log(f"{path}: {msg}")
+
+                stop.wait(interval)
+        except KeyboardInterrupt:
+            log("Stopped watching.")